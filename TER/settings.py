@@ -144,3 +144,8 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 CORS_ORIGIN_ALLOW_ALL = True
+
+# Synonyms of the feature codes for the alignment of the types.
+# With SYNONYMS_CACHE_ONLY the synonyms API is never called, only the local store is read.
+SYNONYMS_CACHE_ONLY = False
+SYNONYMS_API_TIMEOUT = 5
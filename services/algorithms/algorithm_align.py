@@ -1,29 +1,36 @@
-import json
-import requests
-
-from services.models import Parameters, CorrespondenceTypes, CorrespondenceTypesClose, FeatureCode, \
-    CorrespondenceTypesInvalid
-from util.string_matching import distance_levenshtein
+from services.classes.parameters_cache import get_parameter
+from services.classes.synonyms_store import get_synonyms
+from services.classes.types_cache import get_type_tags, NO_STATUS, TOTAL, CLOSE, INVALID
+from services.models import FeatureCode
+from util.string_matching import distance_levenshtein, batch_similarity, batch_best_similarity
 from util.util import get_name_shape, remove_tag_name, print_tags
 
 
-def align_algorithme(entity_gn, list_block_osm_entities):
+def align_algorithme(entity_gn, list_block_osm_entities, feature_name=None):
     """
 
     :param entity_gn:
     :param list_block_osm_entities: avec tag list
+    :param feature_name: the name of the feature code of the entity, already loaded for the batch,
+    if None it is read in the table FeatureCode
     :return:
     """
 
     list_aligned_entities = []
 
-    for entity_osm in list_block_osm_entities:
+    """
+    The names of all the entities of the block, and their variants, are compared together with the
+    names GeoNames
+    """
+    matching_name_levels = match_names(entity_gn, [entity_osm.get('name') for entity_osm in list_block_osm_entities],
+                                       [entity_osm.get('name_variants', []) for entity_osm in list_block_osm_entities])
 
-        matching_name_level = match_name_string(entity_gn, entity_osm.get('name'))
+    for entity_osm, matching_name_level in zip(list_block_osm_entities, matching_name_levels):
 
         type_tag_osm, matching_type_level = match_type_correspondence(entity_gn, entity_osm.get('tag_list'))
         if not type_tag_osm:
-            type_tag_osm, matching_type_level = match_type_synonyms(entity_gn, entity_osm.get('tag_list'))
+            type_tag_osm, matching_type_level = match_type_synonyms(entity_gn, entity_osm.get('tag_list'),
+                                                                    feature_name)
 
         """
         We add to the matched entities list the entities which a level of matching with
@@ -51,7 +58,7 @@ def match_name_string(entity_gn, osm_name):
     :param osm_name:
     :return: the level of matching if it is greater or equals to the parameter, otherwise False
     """
-    param_distance_string = float(Parameters.objects.get(name='minimun_similarity_name_for_align').value)
+    param_distance_string = get_parameter('minimun_similarity_name_for_align', float)
 
     value = distance_levenshtein(entity_gn.get_name(), osm_name)
     if value >= param_distance_string:
@@ -60,6 +67,59 @@ def match_name_string(entity_gn, osm_name):
     return False
 
 
+def match_names(entity_gn, osm_names, osm_variants=None):
+    """
+    We calculate the levenshtein distance between all the osm_names of a block and geonames' names.
+    With the variants of the names (services/algorithms/algorithm_name_variants.py), the level is the
+    best of all the pairs of names, the pairs which can not reach the parameter by their lengths or
+    their prefixes are not calculated
+
+    :param entity_gn:
+    :param osm_names:
+    :param osm_variants: for every osm_name, the list of the variants of the name
+    :return: for every name, the level of matching if it is greater or equals to the parameter, otherwise False
+    """
+    param_distance_string = get_parameter('minimun_similarity_name_for_align', float)
+
+    levels = batch_similarity(entity_gn.get_name(), osm_names, 'levenshtein', param_distance_string)
+
+    gn_variants = entity_gn.get_name_variants()
+    if osm_variants is None:
+        osm_variants = [[] for _ in osm_names]
+
+    if gn_variants:
+        levels = [best_level(level, variant_level) for level, variant_level in
+                  zip(levels, batch_best_similarity(gn_variants, osm_names, 'levenshtein', param_distance_string))]
+
+    """
+    The variants of all the block are compared in one pass
+    """
+    owners = [position for position, variants in enumerate(osm_variants) for _ in variants]
+    if owners:
+        variant_levels = batch_best_similarity([entity_gn.get_name()] + gn_variants,
+                                               [variant for variants in osm_variants for variant in variants],
+                                               'levenshtein', param_distance_string)
+        for position, variant_level in zip(owners, variant_levels):
+            levels[position] = best_level(levels[position], variant_level)
+
+    return levels
+
+
+def best_level(level, other_level):
+    """
+
+    :param level: a level of matching or False
+    :param other_level: a level of matching or False
+    :return: the best level, False if both are False
+    """
+    if level is False:
+        return other_level
+    if other_level is False:
+        return level
+
+    return max(level, other_level)
+
+
 def match_type_correspondence(entity_gn, tag_list):
     """
     This methode check if the type has a entier correspondance with every tag of the object
@@ -70,94 +130,78 @@ def match_type_correspondence(entity_gn, tag_list):
     match_level = 0
     tag_match = False
 
-    similarity_type_for_total_match = float(Parameters.objects.get(name="similarity_type_for_total_match").value)
-    similarity_type_for_users_validation = float(Parameters.objects.get(name="similarity_type_for_users_validation")
-                                                 .value)
+    similarity_type_for_total_match = get_parameter("similarity_type_for_total_match", float)
+    similarity_type_for_users_validation = get_parameter("similarity_type_for_users_validation", float)
+
+    """
+    The correspondences of the type are read in the cache of the process (services.classes.types_cache)
+    """
+    type_tags = get_type_tags(entity_gn.get_feature_class(), entity_gn.get_feature_code())
 
     tag_list = remove_tag_name(tag_list)
     for tag in tag_list:
-        match = CorrespondenceTypes.objects.filter(gn_feature_code=entity_gn.get_feature_code(),
-                                                   gn_feature_class=entity_gn.get_feature_class(),
-                                                   osm_key=tag.key,
-                                                   osm_value=tag.value).count()
+        status = type_tags.get((tag.key, tag.value), NO_STATUS)
 
-        if match > 0:
+        if TOTAL in status:
             return tag, similarity_type_for_total_match
 
-        match_close = CorrespondenceTypesClose.objects.filter(gn_feature_code=entity_gn.get_feature_code(),
-                                                              gn_feature_class=entity_gn.get_feature_class(),
-                                                              osm_key=tag.key,
-                                                              osm_value=tag.value).count()
-
-        if match_close > 0 and max(similarity_type_for_users_validation, match_level) != match_level:
+        if CLOSE in status and max(similarity_type_for_users_validation, match_level) != match_level:
             (tag_match, match_level) = (tag, max(similarity_type_for_users_validation, match_level))
 
-        match_invalid = CorrespondenceTypesInvalid.objects.filter(gn_feature_code=entity_gn.get_feature_code(),
-                                                                  gn_feature_class=entity_gn.get_feature_class(),
-                                                                  osm_key=tag.key,
-                                                                  osm_value=tag.value, active=True).count()
-
-        if match_invalid > 0 and match_level == 0:
+        if INVALID in status and match_level == 0:
             (tag_match, match_level) = (tag, 0)
 
     return tag_match, match_level
 
 
-def match_type_synonyms(entity_gn, tag_list):
+def match_type_synonyms(entity_gn, tag_list, feature_name=None):
     """
     This method is called if we don't find a match between the object and the entier list of tags,
     so here we use the synonyms service for find a match.
 
-    We search synonyms with the marshape api urban
-    Reference: https://market.mashape.com/community/urban-dictionary
-
     :param entity_gn:
     :param tag_list:
+    :param feature_name: the name of the feature code of the entity, if None it is read in the table FeatureCode
     :return:
     """
 
-    feature_code = FeatureCode.objects.get(code=entity_gn.get_feature_class() + '.' + entity_gn.get_feature_code())
-
-    param_api_url = Parameters.objects.get(name='api_synonyms_url').value
-    param_api_hash_key = Parameters.objects.get(name='api_synonyms_hash_key').value
-    param_api_hash_value = Parameters.objects.get(name='api_synonyms_hash_value').value
+    if feature_name is None:
+        feature_name = FeatureCode.objects.filter(code=entity_gn.get_feature_class() + '.' +
+                                                  entity_gn.get_feature_code()).values_list('name', flat=True).first()
 
-    synonyms = []
-    try:
-        if feature_code.name != 'fourth-order administrative division':
-            r = requests.get(param_api_url + feature_code.name,
-                             headers={param_api_hash_key: param_api_hash_value})
+    """
+    Without feature code (many entities GeoNames have an empty code) there is no name to compare
+    """
+    if not feature_name:
+        return '', 0
 
-            json_object = json.loads(r.text)
-            synonyms = json_object["tags"]
-    except Exception as error:
-        print("Error synonyms service" + str(error))
+    """
+    The synonyms are read in the local store (services.classes.synonyms_store), the API is called
+    only for the names not in the store
+    """
+    synonyms = get_synonyms(feature_name)
 
     similarity_type_level = 0
     tag_match = ''
 
-    similarity_type_for_description_in_key = float(Parameters.objects
-                                                   .get(name="similarity_type_for_description_in_key").value)
-    similarity_type_for_description_in_value = float(Parameters.objects
-                                                     .get(name="similarity_type_for_description_in_value").value)
-    similarity_type_for_synonyms_in_value = float(Parameters.objects
-                                                  .get(name="similarity_type_for_synonyms_in_value").value)
-    similarity_type_for_synonyms_in_key = float(Parameters.objects
-                                                .get(name="similarity_type_for_synonyms_in_key").value)
+    similarity_type_for_description_in_key = get_parameter("similarity_type_for_description_in_key", float)
+    similarity_type_for_description_in_value = get_parameter("similarity_type_for_description_in_value", float)
+    similarity_type_for_synonyms_in_value = get_parameter("similarity_type_for_synonyms_in_value", float)
+    similarity_type_for_synonyms_in_key = get_parameter("similarity_type_for_synonyms_in_key", float)
 
     tag_list = remove_tag_name(tag_list)
     for tag in tag_list:
         """
         If we found match with the description and the value of one tag OSM
         """
-        if feature_code.name == tag.value:
+        if feature_name == tag.value:
             similarity_type_level = similarity_type_for_description_in_key
             return tag, similarity_type_level
 
         """
         If we found match with the description and the key of one tag OSM
         """
-        if feature_code.name == tag.key and similarity_type_level < max(similarity_type_for_description_in_value,
+        if feature_name == tag.key and similarity_type_level < max(similarity_type_for_description_in_value,
                                                                         similarity_type_level):
             (tag_match, similarity_type_level) = (tag, max(similarity_type_for_description_in_value,
                                                            similarity_type_level))
@@ -1,21 +1,98 @@
-from services.algorithms.geolocation import GeoLocation
-from services.models import Parameters, Node, Tag, Relation, Way, NODE, WAY, RELATION, CorrespondenceEntity
+from django.db import connection
+from services.algorithms.geolocation import GeoLocation, distances_to, bounding_boxes
+from services.classes.parameters_cache import get_parameter
+from services.models import Node, Tag, Relation, Way, NamedEntity, NODE, WAY, RELATION, AREA, \
+    CorrespondenceEntity
+from services.algorithms.algorithm_named_entities import get_tag_list
+from services.algorithms.algorithm_name_index import filter_by_name
+from services.algorithms.algorithm_name_variants import load_osm_variants
+from datetime import datetime
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
 import operator
 from util.util import get_name_shape
+from util.spatial_grid import get_cells_in_box, count_cells_in_box
 
+DEGREES_PRECISION = Decimal('0.0000001')
+MAX_CELLS_IN_BLOCKING = 400
+SHAPE_MODELS = {NODE: Node, WAY: Way, RELATION: Relation}
 
-def blocking_function(entite, param_distance_ratio=False):
+"""
+With the name pruning, the named entities whose name can not reach the minimum similarity of the
+alignment are not returned by the blocking (services/algorithms/algorithm_name_index.py)
+"""
+_name_pruning = False
+
+"""
+The nodes imported before the spatial grid have not cell until the command spatial-grid, the grid
+is used by the blocking only if all the nodes have a cell. It is checked once by process.
+"""
+_grid_complete = None
+
+"""
+The table of the named entities is used by the blocking if it is built, it is checked once by process
+"""
+_named_entities_built = None
+
+
+def set_name_pruning(name_pruning=True):
+    """
+    The name pruning is used only with the table of the named entities
+    :param name_pruning:
+    :return:
+    """
+    global _name_pruning
+    _name_pruning = name_pruning
+
+
+def is_grid_complete():
+    """
+
+    :return: True if all the nodes have a cell of the spatial grid
+    """
+    global _grid_complete
+    if _grid_complete is None:
+        _grid_complete = not Node.objects.filter(cell__isnull=True).exists()
+
+        if not _grid_complete:
+            print("%s WARNING: Nodes without cell of the spatial grid, the blocking searches the nodes without "
+                  "the grid. Execute ./manage.py spatial-grid." % datetime.now())
+
+    return _grid_complete
+
+
+def is_named_entities_built():
+    """
+
+    :return: True if the table of the named entities has rows
+    """
+    global _named_entities_built
+    if _named_entities_built is None:
+        _named_entities_built = NamedEntity.objects.exists()
+
+    return _named_entities_built
+
+
+def blocking_function(entite, param_distance_ratio=False, nodes=None):
     """
 
     Reference: http://janmatuschek.de/LatitudeLongitudeBoundingCoordinates
     :param entite:
     :param param_distance_ratio:
+    :param nodes: the nodes in the ratio found by a SpatialIndex (services/algorithms/spatial_index.py),
+    if None they are searched in the database
     :return:
     """
     list_match_entities = []
     if not param_distance_ratio:
-        param_distance_ratio = float(Parameters.objects.get(name='search_radius_for_blocking').value)
-    list_entities_in_ratio = get_object_in_ratio(entite, param_distance_ratio)
+        param_distance_ratio = get_parameter('search_radius_for_blocking', float)
+    list_entities_in_ratio = get_object_in_ratio(entite, param_distance_ratio, nodes)
+
+    """
+    If the table of the named entities is built, every entity is read in one row
+    """
+    if is_named_entities_built():
+        return get_named_entities(list_entities_in_ratio,
+                                  [entite.get_name()] + entite.get_name_variants() if _name_pruning else None)
 
     for entity_in_ratio in list_entities_in_ratio:
         reference = entity_in_ratio['id']
@@ -69,6 +146,65 @@ def blocking_function(entite, param_distance_ratio=False):
     return list_match_entities
 
 
+def get_named_entities(list_entities_in_ratio, names=None):
+    """
+    This method gets the named entities of the entities in the ratio with one query. If the shape
+    of an entity is unknown, the node is preferred, then the relation and the way, like in
+    blocking_function.
+    :param list_entities_in_ratio: the list of get_object_in_ratio
+    :param names: if given, only the entities whose name or variants can be similar to one of the names
+    are kept
+    :return: the list of the entities with a name, with their tags and the variants of their name
+    """
+    named_entities = {}
+    name_variants = {}
+    references = {entity_in_ratio['id'] for entity_in_ratio in list_entities_in_ratio}
+    if references:
+        candidates = list(NamedEntity.objects.filter(reference__in=references))
+
+        """
+        The variants of the names of all the entities are read with one query
+        """
+        name_variants = load_osm_variants({(named_entity.reference, named_entity.shape)
+                                           for named_entity in candidates})
+
+        if names:
+            """
+            The entities with variants are not pruned, one of their variants can be similar
+            """
+            without_variants = [named_entity for named_entity in candidates
+                                if (named_entity.reference, named_entity.shape) not in name_variants]
+            kept = set(filter_by_name(names, without_variants,
+                                      get_parameter('minimun_similarity_name_for_align', float)))
+            candidates = [named_entity for named_entity in candidates
+                          if named_entity in kept or (named_entity.reference, named_entity.shape) in name_variants]
+
+        for named_entity in candidates:
+            named_entities[(named_entity.reference, named_entity.shape)] = named_entity
+
+    list_match_entities = []
+    for entity_in_ratio in list_entities_in_ratio:
+        reference = entity_in_ratio['id']
+        shapes = [entity_in_ratio['shape']] if entity_in_ratio.get('shape') else [NODE, RELATION, WAY]
+
+        named_entity = next((named_entities[(reference, shape)] for shape in shapes
+                             if (reference, shape) in named_entities), None)
+        if named_entity is None:
+            continue
+
+        """
+        The entity OSM is not read, only its id is used for the correspondence
+        """
+        list_match_entities.append({'entity_osm': SHAPE_MODELS[named_entity.shape](id=reference),
+                                    'name': named_entity.name,
+                                    'name_variants': name_variants.get((reference, named_entity.shape), []),
+                                    'shape_osm': AREA if named_entity.is_area else named_entity.shape,
+                                    'coordinates': entity_in_ratio['coordinates'],
+                                    'tag_list': get_tag_list(named_entity)})
+
+    return list_match_entities
+
+
 def delete_bd(reference, shape):
     """
     This method delete all the tags and entities without tag name 
@@ -128,10 +264,12 @@ def delete_relation(reference):
     print("Tags, nodes, ways and relations deleted", count)
 
 
-def get_object_in_ratio(entity, ratio):
+def get_object_in_ratio(entity, ratio, nodes=None):
     """
     :param entity: the GeoNames entity
     :param ratio: the distance with we going to search others nodes
+    :param nodes: the nodes in the ratio already found by a SpatialIndex, if None they are searched
+    in the database
     :return: the list the nodes wich are in the ratio
 
     This function returns all the nodes which are in a specific ratio of the entity sent with 
@@ -143,51 +281,73 @@ def get_object_in_ratio(entity, ratio):
     loc = GeoLocation.from_degrees(entity.get_position_gps().get_latitude(),
                                    entity.get_position_gps().get_longitude())
 
-    (min_loc, max_loc) = loc.bounding_locations(ratio)
-    (lat_min, long_min) = min_loc.get_radians_coordinates()
-    (lat_max, long_max) = max_loc.get_radians_coordinates()
-
-    query = "SELECT id FROM services_node n WHERE RADIANS(latitude) >= %(lat_min)s AND RADIANS(latitude) <= " \
-            "%(lat_max)s  AND (RADIANS(longitude) >= %(long_min)s "
+    if nodes is None:
+        query, params = get_nodes_in_ratio_query(loc, ratio)
+        cursor = connection.cursor()
+        cursor.execute(query, params)
 
-    query += "OR " if loc.meridian180_within_distance(ratio) else "AND "
+        rows = cursor.fetchall()
 
-    query += "RADIANS(longitude) <= %(long_max)s) AND ACOS(SIN(%(lat_loc)s) * SIN(RADIANS(latitude)) + " \
-             "COS(%(lat_loc)s) * COS(RADIANS(latitude)) * COS(RADIANS(longitude) - %(long_loc)s)) <= %(ang_radius)s"
+        """
+        The distances of all the nodes are calculated together
+        """
+        distances = distances_to(loc.deg_lat, loc.deg_lon, [row[3] for row in rows], [row[4] for row in rows]) \
+            if rows else []
+
+        nodes = []
+        for (node_id, way_reference_id, relation_reference_id, latitude, longitude, root_reference, root_shape), \
+                distance in zip(rows, distances):
+            nodes.append({
+                'id': node_id,
+                'way_reference_id': way_reference_id,
+                'relation_reference_id': relation_reference_id,
+                'latitude': latitude,
+                'longitude': longitude,
+                'root_reference': root_reference,
+                'root_shape': root_shape,
+                'distance': float(distance)
+            })
 
-    lat_loc, long_loc = loc.get_radians_coordinates()
-    params = {
-        'lat_min': lat_min,
-        'long_min': long_min,
-        'lat_max': lat_max,
-        'long_max': long_max,
-        'lat_loc': lat_loc,
-        'long_loc': long_loc,
-        'ang_radius': loc.get_angular_radius(distance=ratio)
-    }
+    """
+    The parents are the roots calculated after the importation (algorithm_roots), only the nodes
+    without root are searched. The parents and the correspondences already saved are searched for
+    all the nodes together
+    """
+    parents = {node['id']: node['root_reference'] for node in nodes if node.get('root_reference') is not None}
+    without_root = [node for node in nodes if node['id'] not in parents]
+    if without_root:
+        parents.update(get_parents(without_root))
+    matched = {}
+    if parents:
+        for reference_osm, osm_shape in CorrespondenceEntity.objects.filter(
+                reference_gn=entity.get_id(), reference_osm__in=set(parents.values()))\
+                .values_list('reference_osm', 'osm_shape'):
+            matched.setdefault(reference_osm, set()).add(osm_shape)
 
-    node_list = Node.objects.raw(query, params=params)
     entities_list = []
-    for node in node_list:
-        point = Node.objects.get(pk=node.id)
-        shape = get_parent(node.id, node.way_reference_id, node.relation_reference_id)
-        distance = loc.distance_to(GeoLocation.from_degrees(point.latitude, point.longitude))
-
-        try:
-            CorrespondenceEntity.objects.only('id').get(reference_gn=entity.get_id(), reference_osm=shape)
-        except CorrespondenceEntity.DoesNotExist:
+    for node in nodes:
+        reference = int(float(parents[node['id']]))
+        shape = node.get('root_shape') if node.get('root_reference') is not None else None
+
+        if not is_matched(matched, reference, shape):
             entities_list.append({
-                'id': int(float(shape)),
-                'coordinates': (point.latitude, point.longitude),
-                'distance': distance
+                'id': reference,
+                'shape': shape,
+                'coordinates': (node['latitude'], node['longitude']),
+                'distance': node['distance']
             })
 
     new_id = None
+    new_shape = None
     coordinates = None
     final_list = []
     distance = 1000
 
-    entities_list.sort(key=operator.itemgetter('id'))
+    """
+    The ids of the nodes, the ways and the relations are not unique together, an entity is its id
+    and its shape
+    """
+    entities_list.sort(key=get_entity_key)
     """
     We reduce the list for erase entities duplicates
     Control cut
@@ -196,7 +356,7 @@ def get_object_in_ratio(entity, ratio):
 
         (latitude, longitude) = entity_l['coordinates']
 
-        if entity_l['id'] == new_id:
+        if (entity_l['id'], entity_l['shape']) == (new_id, new_shape):
             '''
             If the news coordinates are more closer than the coordinates of the previous point, then we have to replace
             the coordinates and remove the entity of the list, otherwise we ignore the point
@@ -204,6 +364,7 @@ def get_object_in_ratio(entity, ratio):
             if coordinates and distance > entity_l['distance']:
                 final_list.remove({
                     'id': new_id,
+                    'shape': new_shape,
                     'coordinates': coordinates,
                     'distance': distance
                 })
@@ -211,6 +372,7 @@ def get_object_in_ratio(entity, ratio):
                 final_list.append(entity_l)
                 coordinates = (latitude, longitude)
                 new_id = entity_l['id']
+                new_shape = entity_l['shape']
                 distance = entity_l['distance']
         else:
             '''
@@ -220,16 +382,159 @@ def get_object_in_ratio(entity, ratio):
 
             coordinates = (latitude, longitude)
             new_id = entity_l['id']
+            new_shape = entity_l['shape']
             distance = entity_l['distance']
 
     final_list.sort(key=operator.itemgetter('distance'))
     del entities_list
 
-    entities_block = int(Parameters.objects.only('value').get(name='quantity_of_elements_in_blocking_algorithm').value)
+    entities_block = get_parameter('quantity_of_elements_in_blocking_algorithm', int)
 
     return final_list[:entities_block]
 
 
+def get_entity_key(entity_in_ratio):
+    """
+
+    :param entity_in_ratio: an entity of get_object_in_ratio
+    :return: the id and the shape of the entity, the shape unknown is ''
+    """
+    return entity_in_ratio['id'], entity_in_ratio['shape'] or ''
+
+
+def is_matched(matched, reference, shape):
+    """
+    The correspondences keep the shape of the entity OSM, or AREA for the ways and the relations
+    which are areas
+    :param matched: dict {reference_osm: set of osm_shape} of the correspondences already saved
+    :param reference: the id of the entity
+    :param shape: the shape of the entity, None if unknown
+    :return: True if the entity has already a correspondence with the entity GeoNames
+    """
+    for osm_shape in matched.get(reference, ()):
+        if shape is None or not osm_shape or osm_shape == shape or (osm_shape == AREA and shape != NODE):
+            return True
+
+    return False
+
+
+def get_nodes_in_ratio_query(loc, ratio):
+    """
+    This method builds the query of the nodes in the ratio of a location. The nodes are searched
+    in the cells of the grid (util/spatial_grid.py) which cover the bounding box, so the cost does
+    not depend of the quantity of nodes. If the box is too big (the ratio or a pole) or if some nodes
+    have not cell (is_grid_complete), the bounding box is compared with the columns latitude and
+    longitude without functions, so the index (latitude, longitude) is used as a range. The distance on the great circle is calculated only
+    for the nodes inside the box.
+
+    Reference: http://janmatuschek.de/LatitudeLongitudeBoundingCoordinates
+    :param loc: the GeoLocation of the entity
+    :param ratio: the distance in kilometers
+    :return: the query and its parameters
+    """
+    bounds = bounding_boxes([loc.deg_lat], [loc.deg_lon], ratio)
+    lat_min, long_min, lat_max, long_max = (float(bound[0]) for bound in bounds)
+    meridian180 = long_min > long_max
+    lat_min, long_min = to_decimal_degrees(lat_min, ROUND_FLOOR), to_decimal_degrees(long_min, ROUND_FLOOR)
+    lat_max, long_max = to_decimal_degrees(lat_max, ROUND_CEILING), to_decimal_degrees(long_max, ROUND_CEILING)
+
+    query = "SELECT id, way_reference_id, relation_reference_id, latitude, longitude, root_reference, " \
+            "root_shape FROM services_node n WHERE "
+
+    if count_cells_in_box(lat_min, long_min, lat_max, long_max) <= MAX_CELLS_IN_BLOCKING and is_grid_complete():
+        """
+        The ids of the cells are integers calculated here, they are written in the query
+        """
+        cells = get_cells_in_box(lat_min, long_min, lat_max, long_max)
+        query += "cell IN ({0}) AND ".format(", ".join(str(cell) for cell in cells))
+
+    query += "latitude BETWEEN %(lat_min)s AND %(lat_max)s AND (longitude >= %(long_min)s "
+
+    """
+    If the meridian 180 is in the box, the box is in two parts: [long_min, 180] and [-180, long_max]
+    """
+    query += "OR " if meridian180 else "AND "
+
+    query += "longitude <= %(long_max)s) AND ACOS(LEAST(1, SIN(%(lat_loc)s) * SIN(RADIANS(latitude)) + " \
+             "COS(%(lat_loc)s) * COS(RADIANS(latitude)) * COS(RADIANS(longitude) - %(long_loc)s))) " \
+             "<= %(ang_radius)s"
+
+    lat_loc, long_loc = loc.get_radians_coordinates()
+    params = {
+        'lat_min': lat_min,
+        'long_min': long_min,
+        'lat_max': lat_max,
+        'long_max': long_max,
+        'lat_loc': lat_loc,
+        'long_loc': long_loc,
+        'ang_radius': loc.get_angular_radius(distance=ratio)
+    }
+
+    return query, params
+
+
+def to_decimal_degrees(degrees, rounding):
+    """
+    The bounds are compared with DECIMAL(10, 7) columns, so they are given as decimals with the same
+    precision, rounded outside of the box
+    :param degrees:
+    :param rounding: ROUND_FLOOR for the minimum, ROUND_CEILING for the maximum
+    :return:
+    """
+    return Decimal(degrees).quantize(DEGREES_PRECISION, rounding=rounding)
+
+
+def get_parents(nodes):
+    """
+    This method retrieve the parents of a list of nodes like get_parent, with one query for the ways
+    and one query by level of relations.
+
+    :param nodes: list of dicts with the id, way_reference_id and relation_reference_id of the nodes
+    :return: dict with the id of the parent of every node
+    """
+    way_ids = {node['way_reference_id'] for node in nodes if node['way_reference_id'] is not None}
+    way_relations = dict(Way.objects.filter(pk__in=way_ids).values_list('id', 'relation_reference_id')) \
+        if way_ids else {}
+
+    relation_ids = {node['relation_reference_id'] for node in nodes if node['relation_reference_id'] is not None}
+    relation_ids.update(relation for relation in way_relations.values() if relation is not None)
+
+    """
+    The relations of the relations, level by level
+    """
+    relation_parents = {}
+    pending = relation_ids
+    while pending:
+        parents = dict(Relation.objects.filter(pk__in=pending).values_list('id', 'relation_reference_id'))
+        relation_parents.update(parents)
+        pending = {parent for parent in parents.values() if parent is not None and parent not in relation_parents}
+
+    shapes = {}
+    for node in nodes:
+        shape_id = node['id']
+        relation = node['relation_reference_id']
+
+        if node['way_reference_id'] is not None:
+            shape_id = node['way_reference_id']
+            if shape_id not in way_relations:
+                shapes[node['id']] = shape_id
+                continue
+            relation = way_relations[shape_id]
+
+        """
+        The cycles between relations are stopped by the relations already visited
+        """
+        visited = set()
+        while relation is not None and relation not in visited:
+            visited.add(relation)
+            shape_id = relation
+            relation = relation_parents.get(relation)
+
+        shapes[node['id']] = shape_id
+
+    return shapes
+
+
 def get_parent(node_id, node_way_reference_id, node_relation_reference_id):
     """
     This method retrieve the parent of a node. Usually the parent is the Way or Relation 
@@ -241,6 +546,7 @@ def get_parent(node_id, node_way_reference_id, node_relation_reference_id):
     :return: 
     """
     shape_id = node_id
+    visited = set()
 
     try:
         if node_way_reference_id is not None:
@@ -253,7 +559,12 @@ def get_parent(node_id, node_way_reference_id, node_relation_reference_id):
             relation = Relation.objects.only('relation_reference_id').get(pk=node_relation_reference_id).\
                 relation_reference_id
 
-            while relation is not None:
+            """
+            The cycles between relations are stopped by the relations already visited
+            """
+            visited.add(shape_id)
+            while relation is not None and relation not in visited:
+                visited.add(relation)
                 shape_id = relation
                 relation = Relation.objects.only('relation_reference_id').get(pk=shape_id).relation_reference_id
 
@@ -0,0 +1,119 @@
+from datetime import datetime
+from django.db import connection
+from services.models import EntityForClean, NODE, WAY, RELATION
+
+"""
+The entities without name and without parent (the roots) are found with anti-joins against the
+tags. They are kept with all their descendants in the table EntityForClean, and deleted by chunks
+of this table with DELETE ... JOIN, from the tags to the relations.
+"""
+
+CLEAN_CHUNK_SIZE = 50000
+
+UNNAMED_ROOTS = [
+    (NODE, "INSERT IGNORE INTO services_entityforclean (reference, type) "
+           "SELECT n.id, 'NODE' FROM services_node n LEFT JOIN services_tag t ON t.reference = n.id "
+           "AND t.type = 'NODE' AND t.key IN ('name', 'name:en') WHERE n.way_reference_id IS NULL "
+           "AND n.relation_reference_id IS NULL AND t.id IS NULL"),
+    (WAY, "INSERT IGNORE INTO services_entityforclean (reference, type) "
+          "SELECT w.id, 'WAY' FROM services_way w LEFT JOIN services_tag t ON t.reference = w.id "
+          "AND t.type = 'WAY' AND t.key IN ('name', 'name:en') WHERE w.relation_reference_id IS NULL "
+          "AND t.id IS NULL"),
+    (RELATION, "INSERT IGNORE INTO services_entityforclean (reference, type) "
+               "SELECT r.id, 'RELATION' FROM services_relation r LEFT JOIN services_tag t ON t.reference = r.id "
+               "AND t.type = 'RELATION' AND t.key IN ('name', 'name:en') WHERE r.relation_reference_id IS NULL "
+               "AND t.id IS NULL"),
+]
+
+CHILD_RELATIONS = "INSERT IGNORE INTO services_entityforclean (reference, type) " \
+                  "SELECT r.id, 'RELATION' FROM services_relation r JOIN services_entityforclean e " \
+                  "ON e.reference = r.relation_reference_id AND e.type = 'RELATION'"
+
+DESCENDANTS = [
+    "INSERT IGNORE INTO services_entityforclean (reference, type) "
+    "SELECT w.id, 'WAY' FROM services_way w JOIN services_entityforclean e "
+    "ON e.reference = w.relation_reference_id AND e.type = 'RELATION'",
+    "INSERT IGNORE INTO services_entityforclean (reference, type) "
+    "SELECT n.id, 'NODE' FROM services_node n JOIN services_entityforclean e "
+    "ON e.reference = n.relation_reference_id AND e.type = 'RELATION'",
+    "INSERT IGNORE INTO services_entityforclean (reference, type) "
+    "SELECT n.id, 'NODE' FROM services_node n JOIN services_entityforclean e "
+    "ON e.reference = n.way_reference_id AND e.type = 'WAY'",
+]
+
+DETACH_RELATIONS = "UPDATE services_relation r JOIN services_entityforclean e ON e.reference = r.id " \
+                   "SET r.relation_reference_id = NULL WHERE e.type = 'RELATION' AND e.id BETWEEN %s AND %s"
+
+DELETES = [
+    ('name variants', "DELETE v FROM services_namevariant v JOIN services_entityforclean e "
+                      "ON e.reference = v.reference AND e.type = v.shape WHERE v.source = 'OSM' "
+                      "AND e.id BETWEEN %s AND %s"),
+    ('tags', "DELETE t FROM services_tag t JOIN services_entityforclean e ON e.reference = t.reference "
+             "AND e.type = t.type WHERE e.id BETWEEN %s AND %s"),
+    ('nodes', "DELETE n FROM services_node n JOIN services_entityforclean e ON e.reference = n.id "
+              "WHERE e.type = 'NODE' AND e.id BETWEEN %s AND %s"),
+    ('ways', "DELETE w FROM services_way w JOIN services_entityforclean e ON e.reference = w.id "
+             "WHERE e.type = 'WAY' AND e.id BETWEEN %s AND %s"),
+    ('relations', "DELETE r FROM services_relation r JOIN services_entityforclean e ON e.reference = r.id "
+                  "WHERE e.type = 'RELATION' AND e.id BETWEEN %s AND %s"),
+]
+
+
+def clean_entities_without_name(chunk_size=CLEAN_CHUNK_SIZE):
+    """
+    Delete all the entities OSM without name, with their tags and their descendants.
+    :param chunk_size: the quantity of rows of EntityForClean deleted by statement
+    :return: the quantity of rows deleted by type
+    """
+    cursor = connection.cursor()
+    generate_entities_for_clean(cursor)
+
+    cursor.execute("SELECT MIN(id), MAX(id) FROM services_entityforclean")
+    min_id, max_id = cursor.fetchone()
+
+    deleted = {}
+    if min_id is not None:
+        """
+        The relations reference others relations deleted, so we remove these references before
+        """
+        for chunk_begin in range(min_id, max_id + 1, chunk_size):
+            cursor.execute(DETACH_RELATIONS, [chunk_begin, chunk_begin + chunk_size - 1])
+
+        for name, query in DELETES:
+            begin = datetime.now()
+            count = 0
+            for chunk_begin in range(min_id, max_id + 1, chunk_size):
+                cursor.execute(query, [chunk_begin, chunk_begin + chunk_size - 1])
+                count += cursor.rowcount
+
+            deleted[name] = count
+            elapsed = (datetime.now() - begin).total_seconds()
+            print("%s INFO: %d %s deleted (%.0f rows/s)." % (datetime.now(), count, name,
+                                                             count / elapsed if elapsed else 0))
+
+    cursor.execute("TRUNCATE TABLE {0}".format(EntityForClean._meta.db_table))
+
+    return deleted
+
+
+def generate_entities_for_clean(cursor):
+    """
+    This method generates the table with the roots without name and all their descendants
+    :param cursor:
+    :return:
+    """
+    cursor.execute("TRUNCATE TABLE {0}".format(EntityForClean._meta.db_table))
+
+    for shape, query in UNNAMED_ROOTS:
+        cursor.execute(query)
+        print("%s INFO: %d %s without name." % (datetime.now(), cursor.rowcount, shape.lower()))
+
+    """
+    The relations of the relations deleted, level by level
+    """
+    cursor.execute(CHILD_RELATIONS)
+    while cursor.rowcount > 0:
+        cursor.execute(CHILD_RELATIONS)
+
+    for query in DESCENDANTS:
+        cursor.execute(query)
@@ -1,12 +1,34 @@
 from decimal import Decimal
 
+from django.db import connection
+from django.db.models import Max, Min
 from sklearn.tree import tree
-from services.algorithms.pertinence_score import get_pertinence_score_with_weight
 from services.models import Parameters, CorrespondenceEntity, ParametersScorePertinence
+from services.classes.weights_cache import weights_changed
 import numpy as np
 
 DEBUG = False
 
+RECALCULATION_CHUNK_SIZE = 10000
+PROGRESS_INTERVAL = 10
+
+"""
+The active weights of every type (the last ones if there are many), joined with the correspondences
+of a chunk. The correspondences without weights for their type take the global weights.
+"""
+RECALCULATE_PERTINENCE_SCORE = \
+    "UPDATE services_correspondenceentity c " \
+    "JOIN services_parametersscorepertinence g ON g.id = %s " \
+    "LEFT JOIN (SELECT p.gn_feature_class, p.gn_feature_code, p.weight_name, p.weight_type, p.weight_coordinates " \
+    "FROM services_parametersscorepertinence p JOIN (SELECT MAX(id) AS id FROM services_parametersscorepertinence " \
+    "WHERE name = 'weight_matching' AND all_types = 0 AND active = 1 GROUP BY gn_feature_class, gn_feature_code) l " \
+    "ON l.id = p.id) t ON t.gn_feature_class = c.gn_feature_class AND t.gn_feature_code = c.gn_feature_code " \
+    "SET c.pertinence_score = c.similarity_name * COALESCE(t.weight_name, g.weight_name) + " \
+    "c.similarity_type * COALESCE(t.weight_type, g.weight_type) + " \
+    "c.similarity_coordinates * COALESCE(t.weight_coordinates, g.weight_coordinates), " \
+    "c.weight_params_id = g.id " \
+    "WHERE c.id BETWEEN %s AND %s"
+
 
 class LearningAlgorithm:
     def __init__(self):
@@ -115,6 +137,8 @@ class LearningAlgorithm:
         """
         ParametersScorePertinence.objects.filter(name='weight_matching_global', all_types=1, active=True) \
             .update(active=False)
+        weights_changed()
+
         params = ParametersScorePertinence(name='weight_matching_global', all_types=1, active=True,
                                            weight_name=weight_name,
                                            weight_type=weight_type, weight_coordinates=weight_coordinates)
@@ -123,26 +147,39 @@ class LearningAlgorithm:
         return params.id
 
     @staticmethod
-    def recalculate_pertinence_score(weights_id):
-        """
-        
-        :param weights_id: 
-        :return: 
-        """
-        correspondences = CorrespondenceEntity.objects.only('id').all()
-        count = len(correspondences)
-        for correspondence_id in correspondences:
-            row = CorrespondenceEntity.objects.get(pk=correspondence_id.id)
-            _, pertinence_score = get_pertinence_score_with_weight(gn_feature_code=row.gn_feature_code,
-                                                                   gn_feature_class=row.gn_feature_class,
-                                                                   match_name=row.similarity_name,
-                                                                   match_type=row.similarity_type,
-                                                                   match_geographical_coordinates=
-                                                                   row.similarity_coordinates,
-                                                                   weight_id=weights_id)
-            row.pertinence_score = pertinence_score
-            row.weight_params_id = weights_id
-            row.save()
+    def recalculate_pertinence_score(weights_id, scheduled_work=None, chunk_size=RECALCULATION_CHUNK_SIZE,
+                                     progress_interval=PROGRESS_INTERVAL):
+        """
+        The scores are calculated by the database, with one UPDATE by chunk of ids. Like
+        get_pertinence_score_with_weight, a correspondence takes the active weights of its type if
+        they exist, otherwise the weights weights_id.
+
+        :param weights_id: the id of the global weights
+        :param scheduled_work: the ScheduledWork where the progress is saved
+        :param chunk_size: the quantity of ids updated together
+        :param progress_interval: the quantity of chunks between two saves of the progress
+        :return: the quantity of correspondences updated
+        """
+        ids = CorrespondenceEntity.objects.aggregate(id_min=Min('id'), id_max=Max('id'))
+        id_min, id_max = ids['id_min'], ids['id_max']
+        if id_min is None:
+            return 0
+
+        if scheduled_work is not None:
+            scheduled_work.total_rows = CorrespondenceEntity.objects.count()
+            scheduled_work.save()
+
+        cursor = connection.cursor()
+        count = 0
+        chunks = 0
+        for chunk_begin in range(id_min, id_max + 1, chunk_size):
+            cursor.execute(RECALCULATE_PERTINENCE_SCORE, [weights_id, chunk_begin, chunk_begin + chunk_size - 1])
+            count += cursor.rowcount
+            chunks += 1
+
+            if scheduled_work is not None and chunks % progress_interval == 0:
+                scheduled_work.affected_rows = count
+                scheduled_work.save()
 
         return count
 
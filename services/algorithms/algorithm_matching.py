@@ -0,0 +1,235 @@
+from django.db import transaction
+from services.classes.parameters_cache import get_parameter
+from services.models import CorrespondenceEntity, FeatureCode, Geonames, NODE
+from services.classes.classes import EntityGeoNames, PositionGPS
+from services.algorithms.algorithm_blocking import blocking_function
+from services.algorithms.algorithm_align import align_algorithme
+from services.algorithms.algorithm_name_variants import load_geonames_variants
+from services.algorithms.pertinence_score import get_pertinence_score, get_weights_by_type
+from util.coordinates_matching import matching_coordinates_batch
+
+__author__ = 'Amaia Nazabal'
+
+"""
+The spatial index of the processes of the matching. It is built by the parent process before the
+pool, so the processes share its arrays after the fork.
+"""
+_spatial_index = None
+
+
+def match_geonames_entity(gn_entity, search_ratio=False, nodes=None):
+    """
+    This method made the align between an entity from GeoNames and the entities OSM in its ratio,
+    the correspondences are saved and the entity is checked.
+    :param gn_entity: the Geonames entity
+    :param search_ratio: the search ratio for the blocking, the parameter search_radius_for_blocking if False
+    :param nodes: the nodes in the ratio found by a SpatialIndex, if None they are searched in the database
+    :return: the quantity of matchs
+    """
+    correspondences, errors = match_batch([gn_entity.id], search_ratio, None if nodes is None else [nodes])
+    if errors:
+        raise Exception(errors[0][1])
+
+    return correspondences
+
+
+def match_batch(geoname_ids, search_ratio=False, batch_nodes=None):
+    """
+    This method made the align of a batch of GeoNames entities. The feature codes, the search ratio,
+    the weights and the variants of the names are loaded once for all the batch, and the
+    correspondences are written with one bulk_create. The errors are kept, the entities with an
+    error are not checked.
+    :param geoname_ids: the ids of the GeoNames entities
+    :param search_ratio: the search ratio for the blocking, the parameter search_radius_for_blocking if False
+    :param batch_nodes: for every entity, in the order of geoname_ids, the nodes in the ratio found
+    by a SpatialIndex, if None they are searched in the database
+    :return: the quantity of correspondences, and the list of the errors (geonames id, message)
+    """
+    gn_entities = Geonames.objects.in_bulk(geoname_ids)
+
+    if not search_ratio:
+        search_ratio = get_parameter('search_radius_for_blocking', float)
+
+    feature_types = {(gn_entity.fclass, gn_entity.fcode) for gn_entity in gn_entities.values()}
+    feature_names = dict(FeatureCode.objects.filter(code__in={fclass + '.' + fcode for fclass, fcode in feature_types})
+                         .values_list('code', 'name'))
+    weights = get_weights_by_type(feature_types) if feature_types else {}
+    name_variants = load_geonames_variants(list(gn_entities.keys()))
+
+    correspondences = []
+    checked = []
+    errors = []
+    for position, geoname_id in enumerate(geoname_ids):
+        gn_entity = gn_entities.get(geoname_id)
+        if gn_entity is None:
+            errors.append((geoname_id, "The GeoNames entity does not exist"))
+            continue
+
+        nodes = batch_nodes[position] if batch_nodes is not None else None
+        try:
+            correspondences.extend(match_entity(gn_entity, search_ratio, nodes, feature_names, weights,
+                                                name_variants.get(geoname_id)))
+            checked.append(geoname_id)
+        except Exception as error:
+            errors.append((geoname_id, str(error)))
+
+    """
+    The blocking skips the entities already matched with the same shape, an entity of another shape
+    with the same id can not be saved with the entity GeoNames
+    """
+    saved = set(CorrespondenceEntity.objects.filter(reference_gn__in=checked)
+                .values_list('reference_gn', 'reference_osm')) if correspondences else set()
+    correspondences = [correspondence for correspondence in correspondences
+                       if (correspondence.reference_gn, correspondence.reference_osm) not in saved]
+
+    with transaction.atomic():
+        CorrespondenceEntity.objects.bulk_create(correspondences)
+        Geonames.objects.filter(pk__in=checked).update(correspondence_check=True)
+
+    print("Quantite de matchs: ", len(correspondences))
+
+    return len(correspondences), errors
+
+
+def match_entity(gn_entity, search_ratio, nodes, feature_names, weights, name_variants=None):
+    """
+    This method made the align between an entity from GeoNames and the entities OSM in its ratio
+    :param gn_entity: the Geonames entity
+    :param search_ratio: the search ratio for the blocking
+    :param nodes: the nodes in the ratio found by a SpatialIndex, if None they are searched in the database
+    :param feature_names: dict with the name of every feature code
+    :param weights: dict with the weights of every type (gn_feature_class, gn_feature_code)
+    :param name_variants: the variants of the name of the entity (services/algorithms/algorithm_name_variants.py)
+    :return: the list of the correspondences not saved
+    """
+    entity = EntityGeoNames(id=gn_entity.id, name=gn_entity.name, latitude=gn_entity.latitude,
+                            longitude=gn_entity.longitude, feature_class=gn_entity.fclass,
+                            feature_code=gn_entity.fcode, name_variants=name_variants)
+
+    """
+    The entities without feature code are aligned too, their type is compared without synonyms
+    """
+    gn_name_type = feature_names.get(gn_entity.fclass + '.' + gn_entity.fcode, '')
+
+    list_block_entities = blocking_function(entity, search_ratio, nodes)
+    list_align_entities = align_algorithme(entity, list_block_entities, gn_name_type)
+    position_gn = PositionGPS(gn_entity.latitude, gn_entity.longitude)
+
+    """
+    The similarities of the coordinates of all the aligned entities are calculated together
+    """
+    coordinates_matchings = matching_coordinates_batch(position_gn,
+                                                       [entity['coordinates_osm'][0] for entity in list_align_entities],
+                                                       [entity['coordinates_osm'][1] for entity in list_align_entities],
+                                                       search_ratio)
+
+    correspondences = []
+    for entity, coordinates_matching in zip(list_align_entities, coordinates_matchings):
+        (latitude_osm, longitude_osm) = entity['coordinates_osm']
+
+        weight_param, pertinence_score = get_pertinence_score(match_name=entity['name_matching'],
+                                                              match_geographical_coordinates=
+                                                              coordinates_matching,
+                                                              match_type=entity['type_matching'],
+                                                              gn_feature_code=gn_entity.fcode,
+                                                              gn_feature_class=gn_entity.fclass,
+                                                              weights=weights[(gn_entity.fclass, gn_entity.fcode)])
+
+        print("Entity OSM: ", entity['entity_osm'].id, entity['name_matching'], entity['type_matching'],
+              coordinates_matching, pertinence_score)
+        correspondences.append(CorrespondenceEntity(reference_gn=gn_entity.id, reference_osm=entity['entity_osm'].id,
+                                                    gn_name=gn_entity.name,
+                                                    gn_feature_class=gn_entity.fclass,
+                                                    gn_feature_code=gn_entity.fcode,
+                                                    gn_feature_name=gn_name_type,
+                                                    gn_latitude=gn_entity.latitude,
+                                                    gn_longitude=gn_entity.longitude,
+                                                    gn_type=NODE,
+                                                    osm_name=entity['name_osm'],
+                                                    osm_shape=entity['shape_osm'],
+                                                    osm_key_type=getattr(entity['type_tag_osm'], 'key', ''),
+                                                    osm_value_type=getattr(entity['type_tag_osm'], 'value', ''),
+                                                    osm_latitude=latitude_osm,
+                                                    osm_longitude=longitude_osm,
+                                                    similarity_name=entity['name_matching'],
+                                                    similarity_type=entity['type_matching'],
+                                                    similarity_coordinates=coordinates_matching,
+                                                    pertinence_score=pertinence_score,
+                                                    weight_params=weight_param))
+
+    """
+    A correspondence is unique by entity GeoNames and id OSM, for the entities of different shapes
+    with the same id the best pertinence score is kept
+    """
+    best_correspondences = {}
+    for correspondence in correspondences:
+        best = best_correspondences.get(correspondence.reference_osm)
+        if best is None or (correspondence.pertinence_score or 0) > (best.pertinence_score or 0):
+            best_correspondences[correspondence.reference_osm] = correspondence
+
+    return list(best_correspondences.values())
+
+
+def set_spatial_index(spatial_index):
+    """
+
+    :param spatial_index: the SpatialIndex used by match_partition, or None for search in the database
+    :return:
+    """
+    global _spatial_index
+    _spatial_index = spatial_index
+
+
+def unchecked_geonames(region=None):
+    """
+
+    :param region: (lat_min, long_min, lat_max, long_max) in degrees, all the entities if None
+    :return: the queryset of the GeoNames entities not checked, in the region
+    """
+    geonames = Geonames.objects.filter(correspondence_check=False)
+    if region is not None:
+        geonames = geonames.filter(latitude__range=(region[0], region[2]), longitude__range=(region[1], region[3]))
+
+    return geonames
+
+
+def match_partition(task):
+    """
+    This method made the matching of all the GeoNames entities not checked in a range of ids. The
+    errors are kept, the process continues with the next entities.
+    :param task: (id_begin, id_end, search_ratio, batch_size, region), region is None or the region
+    of the entities matched (lat_min, long_min, lat_max, long_max)
+    :return: the quantity of entities matched, and the list of the errors (geonames id, message)
+    """
+    id_begin, id_end, search_ratio, batch_size, region = task
+
+    """
+    The entities outside of the region are not matched, they stay not checked for the next process
+    """
+    ids = list(unchecked_geonames(region).filter(pk__range=(id_begin, id_end))
+               .order_by('id').values_list('id', flat=True))
+
+    affected = 0
+    errors = []
+    for batch_begin in range(0, len(ids), batch_size):
+        batch = ids[batch_begin:batch_begin + batch_size]
+
+        try:
+            batch_nodes = None
+            if _spatial_index is not None:
+                """
+                One query to the spatial index for all the entities of the batch
+                """
+                coordinates = dict((geoname_id, (latitude, longitude)) for geoname_id, latitude, longitude in
+                                   Geonames.objects.filter(pk__in=batch).values_list('id', 'latitude', 'longitude'))
+                batch_nodes = _spatial_index.query([coordinates[geoname_id][0] for geoname_id in batch],
+                                                   [coordinates[geoname_id][1] for geoname_id in batch], search_ratio)
+
+            _, batch_errors = match_batch(batch, search_ratio, batch_nodes)
+        except Exception as error:
+            batch_errors = [(geoname_id, str(error)) for geoname_id in batch]
+
+        affected += len(batch) - len(batch_errors)
+        errors.extend(batch_errors)
+
+    return affected, errors
@@ -0,0 +1,147 @@
+from collections import Counter
+from datetime import datetime
+import math
+from django.db import connection, transaction
+from services.models import NameGram, NamedEntity
+
+"""
+Inverted index of the bigrams of the names of the named entities OSM (NamedEntity). A name is put
+in lowercase and padded with PAD_CHAR, like distance_ngrames, so a name of n characters has n + 1
+bigrams.
+
+The blocking can prune the entities whose name can not reach the minimum similarity of levenshtein
+(q-gram lemma): if the distance of levenshtein of two names is at most k, they have at least
+max(n1, n2) + 1 - 2k bigrams in common.
+"""
+
+GRAM_SIZE = 2
+PAD_CHAR = '$'
+NAME_INDEX_CHUNK_SIZE = 5000
+FLOAT_TOLERANCE = 1e-9
+
+"""
+The bigrams of the entities deleted, and of the entities not indexed (new or renamed)
+"""
+STALE_GRAMS = "DELETE g FROM services_namegram g LEFT JOIN services_namedentity e ON e.id = g.entity " \
+              "WHERE e.id IS NULL OR e.indexed = 0"
+
+NEW_ENTITIES = "SELECT id, name FROM services_namedentity WHERE indexed = 0"
+
+
+def get_grams(name):
+    """
+
+    :param name:
+    :return: Counter with the quantity of every bigram of the name
+    """
+    padded = PAD_CHAR * (GRAM_SIZE - 1) + name.lower() + PAD_CHAR * (GRAM_SIZE - 1)
+    return Counter(padded[position:position + GRAM_SIZE] for position in range(len(padded) - GRAM_SIZE + 1))
+
+
+def refresh_name_index(full=False, chunk_size=NAME_INDEX_CHUNK_SIZE):
+    """
+    Refresh the index after the refresh of the named entities, the bigrams of the entities deleted
+    are deleted and only the entities not indexed (new or renamed) are indexed again
+    :param full: build again all the index
+    :param chunk_size: the quantity of names indexed together
+    :return: the quantity of names indexed
+    """
+    cursor = connection.cursor()
+
+    if full:
+        cursor.execute("TRUNCATE TABLE {0}".format(NameGram._meta.db_table))
+        NamedEntity.objects.filter(indexed=True).update(indexed=False)
+    else:
+        cursor.execute(STALE_GRAMS)
+
+    cursor.execute(NEW_ENTITIES)
+    entities = cursor.fetchall()
+
+    for chunk_begin in range(0, len(entities), chunk_size):
+        grams = [NameGram(gram=gram, entity=entity_id, count=count)
+                 for entity_id, name in entities[chunk_begin:chunk_begin + chunk_size]
+                 for gram, count in get_grams(name).items()]
+
+        with transaction.atomic():
+            NameGram.objects.bulk_create(grams)
+            NamedEntity.objects.filter(pk__in=[entity_id for entity_id, _ in
+                                               entities[chunk_begin:chunk_begin + chunk_size]]).update(indexed=True)
+
+    print("%s INFO: %d names indexed." % (datetime.now(), len(entities)))
+
+    return len(entities)
+
+
+def is_name_index_complete():
+    """
+
+    :return: True if the names of all the named entities are in the index
+    """
+    return not NamedEntity.objects.filter(indexed=False).exists()
+
+
+def get_common_grams(names, entity_ids):
+    """
+    This method counts the bigrams in common between some names and the names of some entities,
+    with one query to the index
+    :param names: the names searched (the name of an entity GeoNames and its alternative names)
+    :param entity_ids: the ids of NamedEntity
+    :return: dict {entity id: list of the quantities of bigrams in common with every name}
+    """
+    names_grams = [get_grams(name) for name in names]
+    grams = set().union(*names_grams)
+
+    common = {entity_id: [0] * len(names) for entity_id in entity_ids}
+    if not grams or not common:
+        return common
+
+    """
+    The comparison of the column can ignore the case or the accents, the bigrams are compared
+    again here
+    """
+    for gram, entity_id, count in NameGram.objects.filter(gram__in=grams, entity__in=common.keys())\
+            .values_list('gram', 'entity', 'count'):
+        for position, name_grams in enumerate(names_grams):
+            if gram in name_grams:
+                common[entity_id][position] += min(count, name_grams[gram])
+
+    return common
+
+
+def can_reach_similarity(name_length, entity_name_length, common_grams, threshold):
+    """
+    The q-gram lemma for the similarity of levenshtein (max - distance) / max
+    :param name_length:
+    :param entity_name_length:
+    :param common_grams: the quantity of bigrams in common
+    :param threshold: the minimum similarity
+    :return: False if the names can not have the similarity
+    """
+    max_length = max(name_length, entity_name_length)
+
+    """
+    The error of the floats can not reduce the distance allowed (1 - 0.9 is less than 0.1)
+    """
+    max_distance = math.floor((1 - threshold) * max_length + FLOAT_TOLERANCE)
+
+    return common_grams >= max_length + 1 - GRAM_SIZE * max_distance
+
+
+def filter_by_name(names, named_entities, threshold):
+    """
+    This method keeps the named entities which can reach the similarity with one of the names
+    :param names: the names of the entity GeoNames
+    :param named_entities: list of NamedEntity
+    :param threshold: the minimum similarity of the names
+    :return: the list of the named entities kept
+    """
+    names = [name for name in names if name]
+    if not names:
+        return named_entities
+
+    common = get_common_grams(names, [named_entity.id for named_entity in named_entities])
+
+    return [named_entity for named_entity in named_entities
+            if any(can_reach_similarity(len(name), len(named_entity.name), common[named_entity.id][position],
+                                        threshold)
+                   for position, name in enumerate(names))]
@@ -0,0 +1,141 @@
+from datetime import datetime
+from django.db import connection, transaction
+from services.classes.bulk_writer import bulk_insert_ignore
+from services.models import Geonames, NameVariant, GEONAMES, OSM
+
+"""
+The table NameVariant keeps the normalized names of the entities, besides their main name: the
+ascii name and the alternative names of GeoNames, the tags name:* of OSM. The variants are built
+at the importation, the alignment compares the variants of a block in one pass
+(services/algorithms/algorithm_align.py).
+
+A name is normalized in lowercase with single spaces, the variants equal to the main name are not
+kept and the quantity of variants of an entity is bounded by MAX_NAME_VARIANTS.
+"""
+
+MAX_NAME_VARIANTS = 50
+VARIANT_MAX_LENGTH = 200
+VARIANTS_CHUNK_SIZE = 5000
+
+
+def normalize_name(name):
+    """
+
+    :param name:
+    :return: the name in lowercase, with single spaces
+    """
+    return ' '.join(name.lower().split())
+
+
+def get_variants(names, main_name=''):
+    """
+
+    :param names: the names of an entity
+    :param main_name: the name compared without the variants
+    :return: the list of the normalized names, without duplicates
+    """
+    main_name = normalize_name(main_name)
+
+    variants = []
+    for name in names:
+        variant = normalize_name(name)
+        if variant and variant != main_name and variant not in variants and len(variant) <= VARIANT_MAX_LENGTH:
+            variants.append(variant)
+
+            if len(variants) == MAX_NAME_VARIANTS:
+                break
+
+    return variants
+
+
+def geonames_variants(geoname):
+    """
+
+    :param geoname: the Geonames entity
+    :return: the NameVariant not saved of the ascii name and the alternative names
+    """
+    names = [geoname.ascii_name] + geoname.alternative_name.split(',')
+
+    return [NameVariant(source=GEONAMES, reference=geoname.id, variant=variant, length=len(variant))
+            for variant in get_variants(names, geoname.name)]
+
+
+def osm_variants(reference, shape, names, main_name=''):
+    """
+
+    :param reference: the id of the entity OSM
+    :param shape: NODE, WAY or RELATION
+    :param names: the values of the tags name:*
+    :param main_name: the value of the tag name
+    :return: the NameVariant not saved
+    """
+    return [NameVariant(source=OSM, reference=reference, shape=shape, variant=variant, length=len(variant))
+            for variant in get_variants(names, main_name)]
+
+
+def load_geonames_variants(geoname_ids):
+    """
+    The variants of a batch of GeoNames entities, with one query
+    :param geoname_ids:
+    :return: dict {geonames id: list of variants}
+    """
+    variants = {}
+    if not geoname_ids:
+        return variants
+
+    for reference, variant in NameVariant.objects.filter(source=GEONAMES, reference__in=geoname_ids)\
+            .order_by('id').values_list('reference', 'variant'):
+        variants.setdefault(reference, []).append(variant)
+
+    return variants
+
+
+def load_osm_variants(keys):
+    """
+    The variants of the entities OSM of a block, with one query
+    :param keys: set of (reference, shape)
+    :return: dict {(reference, shape): list of variants}
+    """
+    variants = {}
+    if not keys:
+        return variants
+
+    for reference, shape, variant in NameVariant.objects.filter(source=OSM, reference__in={key[0] for key in keys})\
+            .order_by('id').values_list('reference', 'shape', 'variant'):
+        if (reference, shape) in keys:
+            variants.setdefault((reference, shape), []).append(variant)
+
+    return variants
+
+
+def refresh_geonames_variants(chunk_size=VARIANTS_CHUNK_SIZE):
+    """
+    Build again the variants of all the GeoNames entities, for the entities imported before the
+    table NameVariant. The tags name:* of OSM are not kept in the database, their variants are
+    only built by the importation.
+    :param chunk_size: the quantity of entities read and written together
+    :return: the quantity of variants written
+    """
+    cursor = connection.cursor()
+    cursor.execute("DELETE FROM {0} WHERE source = %s".format(NameVariant._meta.db_table), [GEONAMES])
+
+    count = 0
+    last_id = None
+    while True:
+        geonames = Geonames.objects.only('id', 'name', 'ascii_name', 'alternative_name').order_by('id')
+        if last_id is not None:
+            geonames = geonames.filter(pk__gt=last_id)
+        geonames = list(geonames[:chunk_size])
+        if not geonames:
+            break
+
+        variants = [variant for geoname in geonames for variant in geonames_variants(geoname)]
+        with transaction.atomic():
+            bulk_insert_ignore(NameVariant, variants)
+
+        count += len(variants)
+        last_id = geonames[-1].id
+
+    print("%s INFO: %d name variants of GeoNames written." % (datetime.now(), count))
+
+    return count
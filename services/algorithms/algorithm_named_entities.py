@@ -0,0 +1,222 @@
+from datetime import datetime
+from decimal import Decimal
+import json
+from django.db import connection, transaction
+from django.db.models import Max
+from services.models import NamedEntity, Node, Tag, ParametersVersion, NODE, WAY, RELATION, AREA
+from services.classes.parameters_cache import get_version
+from util.util import get_name_shape, remove_tag_name
+
+"""
+The table NamedEntity keeps one row by root entity OSM with a name (algorithm_roots), with its name,
+if it is an area, a coordinate and its tags without name. The blocking reads these rows instead
+of searching the entity and its tags in the tables Node, Way, Relation and Tag.
+
+The refresh is incremental: the rows of the entities deleted (or which are not roots anymore) are
+deleted, the named roots without row are added, and only the rows of the entities with tags
+written since the previous refresh are compared with their entity and updated (a renamed row is
+not indexed anymore, see algorithm_name_index). The ids of the tags are increasing, the last id of
+Tag read by a refresh is kept as the version NAMED_ENTITIES_VERSION_ID of ParametersVersion.
+"""
+
+NAMED_CHUNK_SIZE = 5000
+NAMED_ENTITIES_VERSION_ID = 4
+DEGREES_PRECISION = Decimal('0.0000001')
+
+STALE_ENTITIES = {
+    NODE: "DELETE e FROM services_namedentity e LEFT JOIN services_node n ON n.id = e.reference "
+          "AND n.root_shape = 'NODE' WHERE e.shape = 'NODE' AND n.id IS NULL",
+    WAY: "DELETE e FROM services_namedentity e LEFT JOIN services_way w ON w.id = e.reference "
+         "AND w.root_shape = 'WAY' WHERE e.shape = 'WAY' AND w.id IS NULL",
+    RELATION: "DELETE e FROM services_namedentity e LEFT JOIN services_relation r ON r.id = e.reference "
+              "AND r.root_reference = r.id WHERE e.shape = 'RELATION' AND r.id IS NULL",
+}
+
+NEW_ENTITIES = {
+    NODE: "SELECT DISTINCT n.id FROM services_node n JOIN services_tag t ON t.reference = n.id AND t.type = 'NODE' "
+          "AND t.key IN ('name', 'name:en') LEFT JOIN services_namedentity e ON e.reference = n.id "
+          "AND e.shape = 'NODE' WHERE n.root_shape = 'NODE' AND e.id IS NULL",
+    WAY: "SELECT DISTINCT w.id FROM services_way w JOIN services_tag t ON t.reference = w.id AND t.type = 'WAY' "
+         "AND t.key IN ('name', 'name:en') LEFT JOIN services_namedentity e ON e.reference = w.id "
+         "AND e.shape = 'WAY' WHERE w.root_shape = 'WAY' AND e.id IS NULL",
+    RELATION: "SELECT DISTINCT r.id FROM services_relation r JOIN services_tag t ON t.reference = r.id "
+              "AND t.type = 'RELATION' AND t.key IN ('name', 'name:en') LEFT JOIN services_namedentity e "
+              "ON e.reference = r.id AND e.shape = 'RELATION' WHERE r.root_reference = r.id AND e.id IS NULL",
+}
+
+"""
+The rows of the entities with tags written after a tag id
+"""
+TOUCHED_ENTITIES = "SELECT DISTINCT e.id FROM services_namedentity e JOIN services_tag t " \
+                   "ON t.reference = e.reference AND t.type = e.shape WHERE t.id > %s"
+
+"""
+The coordinate of a way or a relation is the average of the coordinates of its nodes
+"""
+ROOT_COORDINATES = "SELECT root_reference, AVG(latitude), AVG(longitude) FROM services_node " \
+                   "WHERE root_shape = %s AND root_reference IN ({0}) GROUP BY root_reference"
+
+
+def refresh_named_entities(full=False, chunk_size=NAMED_CHUNK_SIZE):
+    """
+    Refresh the table NamedEntity after an importation
+    :param full: build again all the table
+    :param chunk_size: the quantity of entities read and written together
+    :return: the quantity of entities deleted, updated and added
+    """
+    cursor = connection.cursor()
+    last_tag_id = Tag.objects.aggregate(Max('id'))['id__max'] or 0
+
+    deleted = 0
+    updated = 0
+    if full:
+        cursor.execute("TRUNCATE TABLE {0}".format(NamedEntity._meta.db_table))
+    else:
+        for shape in (NODE, WAY, RELATION):
+            cursor.execute(STALE_ENTITIES[shape])
+            deleted += cursor.rowcount
+
+        """
+        The entities imported again keep their row, the rows of the entities with new tags are
+        compared with the tags of now
+        """
+        cursor.execute(TOUCHED_ENTITIES, [get_version(NAMED_ENTITIES_VERSION_ID)])
+        touched = sorted(row[0] for row in cursor.fetchall())
+
+        for chunk_begin in range(0, len(touched), chunk_size):
+            named_entities = list(NamedEntity.objects.filter(pk__in=touched[chunk_begin:chunk_begin + chunk_size]))
+
+            for shape in (NODE, WAY, RELATION):
+                chunk_deleted, chunk_updated = named_entities_update(
+                    cursor, shape, [named_entity for named_entity in named_entities if named_entity.shape == shape])
+                deleted += chunk_deleted
+                updated += chunk_updated
+
+    added = 0
+    for shape in (NODE, WAY, RELATION):
+        cursor.execute(NEW_ENTITIES[shape])
+        references = [row[0] for row in cursor.fetchall()]
+
+        for chunk_begin in range(0, len(references), chunk_size):
+            added += named_entities_importation(cursor, shape, references[chunk_begin:chunk_begin + chunk_size])
+
+    ParametersVersion.objects.update_or_create(id=NAMED_ENTITIES_VERSION_ID, defaults={'version': last_tag_id})
+
+    print("%s INFO: %d named entities deleted, %d named entities updated, %d named entities added." %
+          (datetime.now(), deleted, updated, added))
+
+    return deleted, updated, added
+
+
+def named_entities_importation(cursor, shape, references):
+    """
+    Build the rows of NamedEntity of a chunk of roots of the same shape
+    :param cursor:
+    :param shape: NODE, WAY or RELATION
+    :param references: the ids of the roots
+    :return: the quantity of rows written
+    """
+    entities = build_named_entities(cursor, shape, references)
+
+    with transaction.atomic():
+        NamedEntity.objects.bulk_create(entities.values())
+
+    return len(entities)
+
+
+def named_entities_update(cursor, shape, named_entities):
+    """
+    Compare a chunk of rows of NamedEntity of the same shape with their entities, the rows of the
+    entities without name now are deleted and the rows which changed are updated
+    :param cursor:
+    :param shape: NODE, WAY or RELATION
+    :param named_entities: list of NamedEntity
+    :return: the quantity of rows deleted and updated
+    """
+    if not named_entities:
+        return 0, 0
+
+    entities = build_named_entities(cursor, shape, [named_entity.reference for named_entity in named_entities])
+
+    without_name = []
+    changes = []
+    for named_entity in named_entities:
+        entity = entities.get(named_entity.reference)
+        if entity is None:
+            without_name.append(named_entity.id)
+            continue
+
+        values = {field: getattr(entity, field) for field in ('name', 'is_area', 'latitude', 'longitude', 'tags')
+                  if getattr(entity, field) != getattr(named_entity, field)}
+        if values:
+            if 'name' in values:
+                values['indexed'] = False
+            changes.append((named_entity.id, values))
+
+    with transaction.atomic():
+        if without_name:
+            NamedEntity.objects.filter(pk__in=without_name).delete()
+        for named_entity_id, values in changes:
+            NamedEntity.objects.filter(pk=named_entity_id).update(**values)
+
+    return len(without_name), len(changes)
+
+
+def build_named_entities(cursor, shape, references):
+    """
+    Build the NamedEntity not saved of a chunk of roots of the same shape, from their tags and
+    their nodes
+    :param cursor:
+    :param shape: NODE, WAY or RELATION
+    :param references: the ids of the roots
+    :return: dict {reference: NamedEntity}, without the roots without name
+    """
+    tags = {}
+    for reference, key, value in Tag.objects.filter(type=shape, reference__in=references).order_by('id')\
+            .values_list('reference', 'key', 'value'):
+        tags.setdefault(reference, []).append(Tag(reference=reference, type=shape, key=key, value=value))
+
+    if shape == NODE:
+        coordinates = {node_id: (latitude, longitude) for node_id, latitude, longitude in
+                       Node.objects.filter(pk__in=references).values_list('id', 'latitude', 'longitude')}
+    else:
+        cursor.execute(ROOT_COORDINATES.format(", ".join(["%s"] * len(references))), [shape] + list(references))
+        coordinates = {reference: (round_degrees(latitude), round_degrees(longitude))
+                       for reference, latitude, longitude in cursor.fetchall()}
+
+    entities = {}
+    for reference in references:
+        tag_list = tags.get(reference, [])
+        name, is_area = get_name_shape(tag_list)
+        if not name:
+            continue
+
+        latitude, longitude = coordinates.get(reference, (None, None))
+        entities[reference] = NamedEntity(reference=reference, shape=shape, name=name, is_area=is_area == AREA,
+                                          latitude=latitude, longitude=longitude,
+                                          tags=json.dumps([[tag.key, tag.value]
+                                                           for tag in remove_tag_name(tag_list)]))
+
+    return entities
+
+
+def round_degrees(degrees):
+    """
+
+    :param degrees: the average of the coordinates
+    :return: the degrees with the precision of the columns
+    """
+    if degrees is None:
+        return None
+
+    return Decimal(degrees).quantize(DEGREES_PRECISION)
+
+
+def get_tag_list(named_entity):
+    """
+    This method unpacks the tags of a named entity
+    :param named_entity: NamedEntity
+    :return: the list of the tags without name, as Tag not saved
+    """
+    return [Tag(reference=named_entity.reference, type=named_entity.shape, key=key, value=value)
+            for key, value in json.loads(named_entity.tags)]
@@ -0,0 +1,85 @@
+from datetime import datetime
+from django.db import connection
+
+"""
+The root of an entity OSM is the entity of higher level which contains it, like get_parent in
+the blocking: the last relation of the relations of its way or its relation, or the entity itself.
+The roots are calculated after the importation with passes of UPDATE ... JOIN, one pass by level
+of relations, and they are kept in the columns root_reference and root_shape.
+"""
+
+ROOTS_CHUNK_SIZE = 100000
+MAX_RELATION_LEVELS = 100
+
+RESET_RELATIONS = "UPDATE services_relation SET root_reference = NULL"
+
+RELATION_ROOTS = "UPDATE services_relation SET root_reference = id WHERE relation_reference_id IS NULL"
+
+RELATION_LEVEL = "UPDATE services_relation r JOIN services_relation p ON p.id = r.relation_reference_id " \
+                 "SET r.root_reference = p.root_reference " \
+                 "WHERE r.root_reference IS NULL AND p.root_reference IS NOT NULL"
+
+CYCLE_RELATIONS = "SELECT id FROM services_relation WHERE root_reference IS NULL"
+
+"""
+The relations in a cycle, or under a cycle, are their own root
+"""
+BREAK_CYCLES = "UPDATE services_relation SET root_reference = id WHERE root_reference IS NULL"
+
+WAY_ROOTS = "UPDATE services_way w LEFT JOIN services_relation r ON r.id = w.relation_reference_id " \
+            "SET w.root_reference = COALESCE(r.root_reference, w.id), " \
+            "w.root_shape = IF(r.id IS NULL, 'WAY', 'RELATION') WHERE w.id BETWEEN %s AND %s"
+
+NODE_ROOTS = "UPDATE services_node n LEFT JOIN services_way w ON w.id = n.way_reference_id " \
+             "LEFT JOIN services_relation r ON r.id = n.relation_reference_id " \
+             "SET n.root_reference = COALESCE(w.root_reference, r.root_reference, n.id), " \
+             "n.root_shape = CASE WHEN w.id IS NOT NULL THEN w.root_shape " \
+             "WHEN r.id IS NOT NULL THEN 'RELATION' ELSE 'NODE' END WHERE n.id BETWEEN %s AND %s"
+
+
+def calculate_roots(chunk_size=ROOTS_CHUNK_SIZE):
+    """
+    Calculate the roots of all the relations, ways and nodes
+    :param chunk_size: the range of ids of ways and nodes updated by query
+    :return: the ids of the relations in a cycle
+    """
+    cursor = connection.cursor()
+    begin = datetime.now()
+
+    cursor.execute(RESET_RELATIONS)
+    cursor.execute(RELATION_ROOTS)
+
+    """
+    Every pass gives the root to the relations of the level below, the passes are bounded so a
+    cycle between relations can not loop forever
+    """
+    levels = 0
+    while cursor.rowcount > 0 and levels < MAX_RELATION_LEVELS:
+        cursor.execute(RELATION_LEVEL)
+        levels += 1
+
+    cursor.execute(CYCLE_RELATIONS)
+    cycles = [row[0] for row in cursor.fetchall()]
+    if cycles:
+        print("%s WARNING: %d relations in a cycle or under a cycle: %s" %
+              (datetime.now(), len(cycles), ", ".join(str(relation) for relation in cycles[:20])))
+        cursor.execute(BREAK_CYCLES)
+
+    print("%s INFO: Roots of the relations calculated with %d levels." % (datetime.now(), levels))
+
+    for table, query in (('services_way', WAY_ROOTS), ('services_node', NODE_ROOTS)):
+        cursor.execute("SELECT MIN(id), MAX(id) FROM {0}".format(table))
+        min_id, max_id = cursor.fetchone()
+        if min_id is None:
+            continue
+
+        count = 0
+        for chunk_begin in range(min_id, max_id + 1, chunk_size):
+            cursor.execute(query, [chunk_begin, chunk_begin + chunk_size - 1])
+            count += cursor.rowcount
+
+        print("%s INFO: %d roots of %s calculated." % (datetime.now(), count, table))
+
+    print("%s INFO: Roots calculated in %s." % (datetime.now(), datetime.now() - begin))
+
+    return cycles
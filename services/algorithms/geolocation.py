@@ -1,4 +1,5 @@
 import math
+import numpy as np
 
 EARTH_RADIUS = 6378.1  # kilometers
 
@@ -133,4 +134,91 @@ class GeoLocation:
 
     @staticmethod
     def get_angular_radius(distance, radius=EARTH_RADIUS ):
-        return distance / radius
\ No newline at end of file
+        return distance / radius
+
+
+"""
+Counterparts of GeoLocation for arrays of points in degrees, with the same formulas: the points are
+converted once and the distances of all the points are calculated together.
+"""
+
+
+def distance_matrix(latitudes, longitudes, other_latitudes, other_longitudes, radius=EARTH_RADIUS):
+    """
+    The great circle distances between N points and M points, like GeoLocation.distance_to
+
+    :param latitudes: the N latitudes in degrees
+    :param longitudes: the N longitudes in degrees
+    :param other_latitudes: the M latitudes in degrees
+    :param other_longitudes: the M longitudes in degrees
+    :param radius: the radius of the sphere
+    :return: array N x M of the distances
+    """
+    rad_lat = np.radians(np.asarray(latitudes, dtype=np.float64))[:, np.newaxis]
+    rad_lon = np.radians(np.asarray(longitudes, dtype=np.float64))[:, np.newaxis]
+    other_rad_lat = np.radians(np.asarray(other_latitudes, dtype=np.float64))[np.newaxis, :]
+    other_rad_lon = np.radians(np.asarray(other_longitudes, dtype=np.float64))[np.newaxis, :]
+
+    """
+    The errors of the floats can give a cosine a little greater than 1 for the same point
+    """
+    cosines = np.sin(rad_lat) * np.sin(other_rad_lat) + \
+        np.cos(rad_lat) * np.cos(other_rad_lat) * np.cos(rad_lon - other_rad_lon)
+
+    return radius * np.arccos(np.clip(cosines, -1, 1))
+
+
+def distances_to(latitude, longitude, latitudes, longitudes, radius=EARTH_RADIUS):
+    """
+    The great circle distances between one point and N points
+
+    :param latitude: in degrees
+    :param longitude: in degrees
+    :param latitudes: the N latitudes in degrees
+    :param longitudes: the N longitudes in degrees
+    :param radius: the radius of the sphere
+    :return: array of the N distances
+    """
+    return distance_matrix([float(latitude)], [float(longitude)], latitudes, longitudes, radius)[0]
+
+
+def bounding_boxes(latitudes, longitudes, distance, radius=EARTH_RADIUS):
+    """
+    The bounding boxes of N points, like GeoLocation.bounding_locations. If the meridian 180 is in
+    a box, its minimum longitude is greater than its maximum longitude.
+
+    :param latitudes: the N latitudes in degrees
+    :param longitudes: the N longitudes in degrees
+    :param distance: the distance from the points, in the unit of the radius
+    :param radius: the radius of the sphere
+    :return: the arrays of the minimum latitudes, minimum longitudes, maximum latitudes and maximum
+    longitudes in degrees
+    """
+    if radius < 0 or distance < 0:
+        raise Exception("Illegal arguments")
+
+    rad_lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    rad_lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+
+    # angular distance in radians on a great circle
+    rad_dist = distance / radius
+
+    min_lat = rad_lat - rad_dist
+    max_lat = rad_lat + rad_dist
+
+    # a pole is within the distance outside of these boxes
+    inside = (min_lat > GeoLocation.MIN_LAT) & (max_lat < GeoLocation.MAX_LAT)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta_lon = np.arcsin(np.clip(math.sin(rad_dist) / np.cos(rad_lat), -1, 1))
+
+    min_lon = np.where(inside, rad_lon - delta_lon, GeoLocation.MIN_LON)
+    min_lon = np.where(min_lon < GeoLocation.MIN_LON, min_lon + 2 * math.pi, min_lon)
+
+    max_lon = np.where(inside, rad_lon + delta_lon, GeoLocation.MAX_LON)
+    max_lon = np.where(max_lon > GeoLocation.MAX_LON, max_lon - 2 * math.pi, max_lon)
+
+    min_lat = np.where(inside, min_lat, np.maximum(min_lat, GeoLocation.MIN_LAT))
+    max_lat = np.where(inside, max_lat, np.minimum(max_lat, GeoLocation.MAX_LAT))
+
+    return np.degrees(min_lat), np.degrees(min_lon), np.degrees(max_lat), np.degrees(max_lon)
@@ -1,9 +1,11 @@
 from services.models import ParametersScorePertinence
+from services.classes.weights_cache import weight_resolver, get_weights, get_weight_triple
 
 
 def get_pertinence_score(**kwargs):
     """
-    This method determines the global score according to the weights of every attribute
+    This method determines the global score according to the weights of every attribute.
+    The weights can be sent already loaded (get_weights_by_type) with the key weights.
     
     :param kwargs: 
     :return: 
@@ -16,19 +18,15 @@ def get_pertinence_score(**kwargs):
 
     match_geographical_coordinates = float(kwargs.get('match_geographical_coordinates', 0))
 
-    try:
-        params = ParametersScorePertinence.objects.get(name='weight_matching',
-                                                       gn_feature_code=gn_feature_code,
-                                                       gn_feature_class=gn_feature_class,
-                                                       all_types=False,
-                                                       active=True)
-    except ParametersScorePertinence.DoesNotExist:
-        params = ParametersScorePertinence.objects.get(name='weight_matching_global',
-                                                       all_types=True, active=True)
-
-    weight_geographical_coordinates = float(params.weight_coordinates)
-    weight_name_matching = float(params.weight_name)
-    weight_type_matching = float(params.weight_type)
+    params = kwargs.get('weights')
+    if params is None:
+        """
+        The weights are read from the cache of the process, without query
+        """
+        params, (weight_name_matching, weight_type_matching, weight_geographical_coordinates) = \
+            get_weights(gn_feature_class, gn_feature_code)
+    else:
+        weight_name_matching, weight_type_matching, weight_geographical_coordinates = get_weight_triple(params)
 
     match_name_pertinence = match_name * weight_name_matching
     match_type_pertinence = match_type * weight_type_matching
@@ -52,13 +50,10 @@ def get_pertinence_score_with_weight(**kwargs):
 
     weight_id = int(kwargs.get('weight_id', 0))
 
-    try:
-        params = ParametersScorePertinence.objects.get(name='weight_matching',
-                                                       gn_feature_code=gn_feature_code,
-                                                       gn_feature_class=gn_feature_class,
-                                                       all_types=False,
-                                                       active=True)
-    except ParametersScorePertinence.DoesNotExist:
+    type_weights = weight_resolver.resolve_type(gn_feature_class, gn_feature_code)
+    if type_weights is not None:
+        params = type_weights[0]
+    else:
         params = ParametersScorePertinence.objects.get(pk=weight_id)
 
     weight_geographical_coordinates = float(params.weight_coordinates)
@@ -70,3 +65,13 @@ def get_pertinence_score_with_weight(**kwargs):
     match_geographical_coordinates_pertinence = match_geographical_coordinates * weight_geographical_coordinates
 
     return params, match_name_pertinence + match_type_pertinence + match_geographical_coordinates_pertinence
+
+
+def get_weights_by_type(feature_types):
+    """
+    This method gives the weights of many types of GeoNames from the cache of the process, the types
+    without their own weights have the global weights
+    :param feature_types: list of (gn_feature_class, gn_feature_code)
+    :return: dict with the weights (ParametersScorePertinence) of every type
+    """
+    return {feature_type: get_weights(*feature_type)[0] for feature_type in set(feature_types)}
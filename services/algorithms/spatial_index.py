@@ -0,0 +1,165 @@
+from array import array
+from datetime import datetime
+from django.db import connection
+import numpy as np
+from sklearn.neighbors import BallTree
+from services.algorithms.geolocation import EARTH_RADIUS, bounding_boxes
+from services.models import NODE, WAY, RELATION
+
+"""
+The references NULL of the nodes are kept as NO_REFERENCE in the arrays
+"""
+NO_REFERENCE = -1
+SHAPES = (None, NODE, WAY, RELATION)
+FETCH_SIZE = 100000
+
+
+class SpatialIndex:
+    """
+    Index in memory of the coordinates of the nodes OSM, with a BallTree and the haversine metric.
+
+    The nodes are loaded once in arrays NumPy, after that the nodes in the ratio of a batch of
+    GeoNames entities are found with one query on the tree, without query to the database.
+    """
+
+    def __init__(self, ids, latitudes, longitudes, way_references, relation_references, root_references,
+                 root_shapes):
+        """
+
+        :param ids: array of the ids of the nodes
+        :param latitudes: array of the latitudes in degrees
+        :param longitudes: array of the longitudes in degrees
+        :param way_references: array of the ways of the nodes, NO_REFERENCE without way
+        :param relation_references: array of the relations of the nodes, NO_REFERENCE without relation
+        :param root_references: array of the roots of the nodes, NO_REFERENCE without root
+        :param root_shapes: array of the positions in SHAPES of the shapes of the roots
+        """
+        self.ids = ids
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.way_references = way_references
+        self.relation_references = relation_references
+        self.root_references = root_references
+        self.root_shapes = root_shapes
+
+        self.tree = BallTree(np.radians(np.column_stack((latitudes, longitudes))), metric='haversine') \
+            if len(ids) else None
+
+    @classmethod
+    def from_database(cls, region=None):
+        """
+        Load the nodes of the database
+        :param region: (lat_min, long_min, lat_max, long_max) in degrees, all the nodes if None
+        :return: the SpatialIndex of the nodes
+        """
+        query = "SELECT id, latitude, longitude, way_reference_id, relation_reference_id, root_reference, " \
+                "root_shape FROM services_node"
+        params = []
+        if region is not None:
+            query += " WHERE latitude BETWEEN %s AND %s AND longitude BETWEEN %s AND %s"
+            params = [region[0], region[2], region[1], region[3]]
+
+        ids, way_references, relation_references, root_references = array('q'), array('q'), array('q'), array('q')
+        latitudes, longitudes = array('d'), array('d')
+        root_shapes = array('b')
+
+        cursor = connection.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchmany(FETCH_SIZE)
+        while rows:
+            for node_id, latitude, longitude, way_reference, relation_reference, root_reference, root_shape \
+                    in rows:
+                ids.append(node_id)
+                latitudes.append(float(latitude))
+                longitudes.append(float(longitude))
+                way_references.append(NO_REFERENCE if way_reference is None else way_reference)
+                relation_references.append(NO_REFERENCE if relation_reference is None else relation_reference)
+                root_references.append(NO_REFERENCE if root_reference is None else root_reference)
+                root_shapes.append(SHAPES.index(root_shape))
+            rows = cursor.fetchmany(FETCH_SIZE)
+
+        begin = datetime.now()
+        index = cls(np.frombuffer(ids, dtype=np.int64), np.frombuffer(latitudes, dtype=np.float64),
+                    np.frombuffer(longitudes, dtype=np.float64), np.frombuffer(way_references, dtype=np.int64),
+                    np.frombuffer(relation_references, dtype=np.int64),
+                    np.frombuffer(root_references, dtype=np.int64), np.frombuffer(root_shapes, dtype=np.int8))
+        print("%s INFO: Spatial index of %d nodes built in %s." % (datetime.now(), len(ids),
+                                                                    datetime.now() - begin))
+
+        return index
+
+    def query(self, latitudes, longitudes, ratio):
+        """
+        Search the nodes in the ratio of a batch of points
+        :param latitudes: the latitudes of the points in degrees
+        :param longitudes: the longitudes of the points in degrees
+        :param ratio: the distance in kilometers
+        :return: for every point, the list of the nodes in the ratio, every node is a dict with the
+        id, way_reference_id, relation_reference_id, root_reference, root_shape, latitude, longitude and distance
+        """
+        if self.tree is None:
+            return [[] for _ in latitudes]
+
+        points = np.radians(np.column_stack((np.asarray(latitudes, dtype=np.float64),
+                                             np.asarray(longitudes, dtype=np.float64))))
+        indices, distances = self.tree.query_radius(points, r=ratio / EARTH_RADIUS, return_distance=True)
+
+        return [[self.get_node(position, distance * EARTH_RADIUS) for position, distance in zip(positions, angles)]
+                for positions, angles in zip(indices, distances)]
+
+    def nodes_in_ratio(self, latitude, longitude, ratio):
+        """
+
+        :param latitude: in degrees
+        :param longitude: in degrees
+        :param ratio: the distance in kilometers
+        :return: the list of the nodes in the ratio of the point
+        """
+        return self.query([float(latitude)], [float(longitude)], ratio)[0]
+
+    def get_node(self, position, distance):
+        """
+
+        :param position: the position of the node in the arrays
+        :param distance: the distance in kilometers to the point searched
+        :return: the node as a dict
+        """
+        way_reference = int(self.way_references[position])
+        relation_reference = int(self.relation_references[position])
+        root_reference = int(self.root_references[position])
+
+        return {
+            'id': int(self.ids[position]),
+            'way_reference_id': None if way_reference == NO_REFERENCE else way_reference,
+            'relation_reference_id': None if relation_reference == NO_REFERENCE else relation_reference,
+            'root_reference': None if root_reference == NO_REFERENCE else root_reference,
+            'root_shape': SHAPES[self.root_shapes[position]],
+            'latitude': float(self.latitudes[position]),
+            'longitude': float(self.longitudes[position]),
+            'distance': float(distance)
+        }
+
+
+def padded_region(region, distance):
+    """
+    The region of the nodes of the GeoNames entities of a region: the nodes in the ratio of the
+    entities near the border of the region are outside of it
+    :param region: (lat_min, long_min, lat_max, long_max) in degrees
+    :param distance: the search ratio in kilometers
+    :return: (lat_min, long_min, lat_max, long_max) in degrees, with all the longitudes if the box of
+    a corner crosses the meridian 180 or a pole
+    """
+    lat_min, long_min, lat_max, long_max = region
+
+    """
+    The boxes of the corners are the widest, the longitudes of a box grow with the latitude
+    """
+    min_lats, min_longs, max_lats, max_longs = bounding_boxes([lat_min, lat_min, lat_max, lat_max],
+                                                              [long_min, long_max, long_min, long_max], distance)
+
+    if (min_longs > max_longs).any() or (max_longs - min_longs >= 360).any():
+        padded_long_min, padded_long_max = -180.0, 180.0
+    else:
+        padded_long_min, padded_long_max = float(min_longs.min()), float(max_longs.max())
+
+    return float(min_lats.min()), padded_long_min, float(max_lats.max()), padded_long_max
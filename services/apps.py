@@ -1,5 +1,28 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
 
 
 class ServicesConfig(AppConfig):
     name = 'services'
+
+    def ready(self):
+        """
+        The changes of the parameters, of the correspondences between types and of the weights of the
+        pertinence score invalidate their caches
+        :return:
+        """
+        from services.models import Parameters, CorrespondenceTypes, CorrespondenceTypesClose, \
+            CorrespondenceTypesInvalid, ParametersScorePertinence
+        from services.classes.parameters_cache import parameters_changed
+        from services.classes.types_cache import types_changed
+        from services.classes.weights_cache import weights_changed
+
+        post_save.connect(parameters_changed, sender=Parameters, dispatch_uid='parameters_changed_save')
+        post_delete.connect(parameters_changed, sender=Parameters, dispatch_uid='parameters_changed_delete')
+
+        for model in (CorrespondenceTypes, CorrespondenceTypesClose, CorrespondenceTypesInvalid):
+            post_save.connect(types_changed, sender=model, dispatch_uid='types_changed_save_%s' % model.__name__)
+            post_delete.connect(types_changed, sender=model, dispatch_uid='types_changed_delete_%s' % model.__name__)
+
+        post_save.connect(weights_changed, sender=ParametersScorePertinence, dispatch_uid='weights_changed_save')
+        post_delete.connect(weights_changed, sender=ParametersScorePertinence, dispatch_uid='weights_changed_delete')
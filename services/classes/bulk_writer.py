@@ -0,0 +1,190 @@
+from collections import OrderedDict
+from datetime import datetime
+from django.db import connection, models, transaction
+
+
+class FlushError(Exception):
+    """
+    A batch could not be written, the checkpoint of the batch is not saved
+    """
+    pass
+
+
+class BulkWriter:
+    """
+    Buffer of model instances which are written to the database by batches with bulk_create.
+
+    Every batch is written inside one transaction, if it fails the rows of the batch are written
+    one by one and the rows with errors are counted in error_rows.
+    """
+
+    def __init__(self, batch_size=5000, callback=None, checkpoint=None, ignore_models=(), log=print):
+        """
+
+        :param batch_size: the quantity of rows kept in memory before a flush
+        :param callback: function called with the writer after every flush
+        :param checkpoint: function called with the writer inside the transaction of every flush
+        :param ignore_models: the models written with INSERT IGNORE, their rows already saved are
+        not written again
+        :param log: function called with the warnings of the rows not written
+        """
+        self.batch_size = batch_size
+        self.callback = callback
+        self.checkpoint = checkpoint
+        self.ignore_models = tuple(ignore_models)
+        self.log = log
+
+        self.rows = 0
+        self.error_rows = 0
+        self.begin = datetime.now()
+
+        self._instances = OrderedDict()
+        self._pending = 0
+
+    def add(self, *instances):
+        """
+        Keep new instances in the buffer, the buffer is flushed if it is full.
+        The instances given together are always written in the same batch.
+        :param instances: unsaved model instances
+        :return:
+        """
+        for instance in instances:
+            self._instances.setdefault(type(instance), []).append(instance)
+        self._pending += len(instances)
+
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all the instances in the buffer in one transaction. If the multi-row insert fails,
+        the instances are written one by one and only the rows with errors are lost
+        :return: the quantity of rows written
+        """
+        if self._pending == 0:
+            return 0
+
+        pending = self._pending
+
+        try:
+            with transaction.atomic():
+                for model, instances in self._instances.items():
+                    self._write(model, instances)
+
+                if self.checkpoint:
+                    self.checkpoint(self)
+
+            written = pending
+        except Exception as error:
+            written = self._write_one_by_one(error)
+        finally:
+            self._instances.clear()
+            self._pending = 0
+
+        self.rows += written
+        self.error_rows += pending - written
+
+        if self.callback:
+            self.callback(self)
+
+        return written
+
+    def _write(self, model, instances):
+        """
+
+        :param model:
+        :param instances: unsaved instances of the model
+        :return:
+        """
+        if model in self.ignore_models:
+            bulk_insert_ignore(model, instances, batch_size=self.batch_size)
+        else:
+            model.objects.bulk_create(instances, batch_size=self.batch_size)
+
+    def _write_one_by_one(self, error):
+        """
+        Write the instances of the buffer one by one, the checkpoint is saved after them
+        :param error: the error of the multi-row insert
+        :return: the quantity of rows written
+        """
+        written = 0
+        for model, instances in self._instances.items():
+            for instance in instances:
+                try:
+                    with transaction.atomic():
+                        if model in self.ignore_models:
+                            bulk_insert_ignore(model, [instance])
+                        else:
+                            instance.save(force_insert=True)
+                    written += 1
+                except Exception as row_error:
+                    self.log("%s WARNING: %s %s not written: %s" % (datetime.now(), model.__name__,
+                                                                    get_instance_key(instance), row_error))
+
+        """
+        If no row can be written the error is not in the rows (the connection, the tables)
+        """
+        if written == 0:
+            self.error_rows += self._pending
+            raise FlushError(error)
+
+        if self.checkpoint:
+            with transaction.atomic():
+                self.checkpoint(self)
+
+        self.log("%s WARNING: %d rows not written: %s" % (datetime.now(), self._pending - written, error))
+
+        return written
+
+    def rows_per_second(self):
+        """
+
+        :return: the quantity of rows written by second since the creation of the writer
+        """
+        elapsed = (datetime.now() - self.begin).total_seconds()
+        if elapsed == 0:
+            return 0
+
+        return self.rows / elapsed
+
+
+def get_instance_key(instance):
+    """
+
+    :param instance: a model instance
+    :return: the primary key of the instance, or its reference and its type for the rows without
+    primary key before the insert (tags, memberships, variants)
+    """
+    if instance.pk is not None:
+        return instance.pk
+
+    return tuple(getattr(instance, name) for name in ('reference', 'type', 'shape') if hasattr(instance, name))
+
+
+def bulk_insert_ignore(model, instances, batch_size=5000):
+    """
+    Multi-row INSERT IGNORE of MySQL, the rows which break a unique key are not written. The
+    bulk_create of Django 1.10 can not ignore the conflicts. The primary keys of the instances are
+    not set.
+    :param model:
+    :param instances: unsaved instances of the model
+    :param batch_size: the quantity of rows by statement
+    :return: the quantity of rows written
+    """
+    fields = [field for field in model._meta.concrete_fields if not isinstance(field, models.AutoField)]
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+
+    cursor = connection.cursor()
+    count = 0
+    for batch_begin in range(0, len(instances), batch_size):
+        batch = instances[batch_begin:batch_begin + batch_size]
+        query = "INSERT IGNORE INTO {0} ({1}) VALUES {2}".format(
+            connection.ops.quote_name(model._meta.db_table), columns, ', '.join([placeholders] * len(batch)))
+
+        params = [field.get_db_prep_save(field.pre_save(instance, True), connection)
+                  for instance in batch for field in fields]
+        cursor.execute(query, params)
+        count += cursor.rowcount
+
+    return count
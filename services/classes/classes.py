@@ -43,6 +43,7 @@ class Entity:
         """
         self._id = kwargs.get('id')
         self._name = kwargs.get('name', '')
+        self._name_variants = kwargs.get('name_variants') or []
         self._type = kwargs.get('type', '')
         self._position_gps = PositionGPS(latitude=kwargs.get('latitude', 0),
                                          longitude=kwargs.get('longitude', 0))
@@ -53,6 +54,9 @@ class Entity:
     def get_name(self):
         return self._name
 
+    def get_name_variants(self):
+        return self._name_variants
+
     def get_type(self):
         return self._type
 
@@ -0,0 +1,134 @@
+from array import array
+import numpy as np
+from services.classes.osm_reader import read_osm_file, OsmNode, OsmWay, OsmRelation
+
+NAME_KEYS = ('name', 'name:en')
+
+
+class IdSet:
+    """
+    Compact set of OSM ids, 8 bytes by id. The ids are added in an array and the set is
+    sorted once with freeze, after that we can search an id.
+    """
+
+    def __init__(self):
+        self._ids = array('q')
+        self._sorted = None
+
+    def add(self, element_id):
+        self._ids.append(element_id)
+
+    def extend(self, ids):
+        self._ids.extend(ids)
+
+    def freeze(self):
+        """
+        Sort the ids and remove the duplicates
+        :return:
+        """
+        ids = np.frombuffer(self._ids, dtype=np.int64) if len(self._ids) else np.empty(0, dtype=np.int64)
+        self._sorted = np.unique(ids) if self._sorted is None else np.union1d(self._sorted, ids)
+        self._ids = array('q')
+
+    def __contains__(self, element_id):
+        position = np.searchsorted(self._sorted, element_id)
+        return position < len(self._sorted) and self._sorted[position] == element_id
+
+    def __len__(self):
+        return len(self._sorted)
+
+
+class NamedEntitiesFilter:
+    """
+    Decide during the importation which elements OSM are kept: the elements with a name, and
+    all the elements referenced by them (the relations of the relations, their ways, and the
+    nodes of the ways and the relations).
+
+    The file is scanned before the importation: a first pass reads the ways and the relations,
+    a second pass reads again the ways only if a relation needs ways without name.
+    """
+
+    def __init__(self):
+        self.nodes = IdSet()
+        self.ways = IdSet()
+        self.relations = set()
+
+    @classmethod
+    def scan(cls, file, processes=1):
+        """
+        Scan the file OSM and keep the ids of the elements referenced by an element with a name
+        :param file: the file OSM (.osm or .osm.pbf)
+        :param processes: the quantity of processes for decode the PBF blocks
+        :return: the filter for the file
+        """
+        named_filter = cls()
+
+        named_relations = []
+        relation_members = {}
+        for _, element in read_osm_file(file, processes):
+            if isinstance(element, OsmWay) and has_name(element.tags):
+                named_filter.ways.add(element.id)
+                named_filter.nodes.extend(element.refs)
+
+            elif isinstance(element, OsmRelation):
+                relation_members[element.id] = [(member.type, member.ref) for member in element.members]
+                if has_name(element.tags):
+                    named_relations.append(element.id)
+
+        """
+        The relations referenced by a relation kept, level by level
+        """
+        pending = named_relations
+        while pending:
+            named_filter.relations.update(pending)
+            pending = [ref for relation_id in pending for member_type, ref in relation_members.get(relation_id, [])
+                       if member_type == 'relation' and ref not in named_filter.relations]
+
+        named_filter.ways.freeze()
+        ways_required = set()
+        for relation_id in named_filter.relations:
+            for member_type, ref in relation_members.get(relation_id, []):
+                if member_type == 'node':
+                    named_filter.nodes.add(ref)
+                elif member_type == 'way' and ref not in named_filter.ways:
+                    ways_required.add(ref)
+        del relation_members
+
+        if ways_required:
+            for _, element in read_osm_file(file, processes):
+                if isinstance(element, OsmRelation):
+                    break
+                if isinstance(element, OsmWay) and element.id in ways_required:
+                    named_filter.nodes.extend(element.refs)
+
+            named_filter.ways.extend(ways_required)
+            named_filter.ways.freeze()
+
+        named_filter.nodes.freeze()
+
+        return named_filter
+
+    def keep(self, element):
+        """
+
+        :param element: OsmNode, OsmWay or OsmRelation
+        :return: True if the element must be imported
+        """
+        if has_name(element.tags):
+            return True
+
+        if isinstance(element, OsmNode):
+            return element.id in self.nodes
+        if isinstance(element, OsmWay):
+            return element.id in self.ways
+
+        return element.id in self.relations
+
+
+def has_name(tags):
+    """
+
+    :param tags: the list of (key, value) of an element
+    :return: True if the element has a name
+    """
+    return any(key in NAME_KEYS for key, _ in tags)
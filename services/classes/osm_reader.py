@@ -0,0 +1,449 @@
+import struct
+import zlib
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from multiprocessing import Pool
+
+"""
+Readers of the OSM dumps. Both formats give the same stream of elements, so the importation
+doesn't depend of the format of the file.
+
+Every element is given with a byte offset of the file from which the reading can be restarted,
+the elements before the element in the same block (or line) are read again in this case.
+
+Reference PBF: http://wiki.openstreetmap.org/wiki/PBF_Format
+"""
+
+OsmNode = namedtuple('OsmNode', ['id', 'latitude', 'longitude', 'tags'])
+OsmWay = namedtuple('OsmWay', ['id', 'refs', 'tags'])
+OsmRelation = namedtuple('OsmRelation', ['id', 'members', 'tags'])
+OsmMember = namedtuple('OsmMember', ['type', 'ref', 'role'])
+
+PBF_MEMBER_TYPES = ('node', 'way', 'relation')
+XML_ELEMENT_STARTS = (b'<node', b'<way', b'<relation')
+PBF_MAX_HEADER_SIZE = 64 * 1024
+PBF_MAX_BLOB_SIZE = 32 * 1024 * 1024
+
+
+def is_pbf_file(file):
+    """
+
+    :param file:
+    :return: True if the file is a PBF dump according to its extension
+    """
+    return file.lower().endswith('.pbf')
+
+
+def read_osm_file(file, processes=1, offset=0):
+    """
+    Return the elements of the dump, with the reader according to the format of the file
+    :param file:
+    :param processes: the quantity of processes for decode the PBF blocks
+    :param offset: the byte offset where the reading begins, given before with an element
+    :return: a generator of (offset, element)
+    """
+    if is_pbf_file(file):
+        return read_osm_pbf(file, processes, offset=offset)
+
+    return read_osm_xml(file, offset)
+
+
+def read_osm_xml(file, offset=0):
+    """
+    Read the XML file line by line, the elements are cleared once they are read.
+    The offset of an element is the beginning of the line where it starts, if the line
+    starts with the element.
+    :param file:
+    :param offset:
+    :return: a generator of (offset, OsmNode | OsmWay | OsmRelation)
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+    depth = 0
+    safe_offset = element_offset = position = offset
+
+    with open(file, 'rb') as file_object:
+        if offset:
+            file_object.seek(offset)
+            parser.feed(b'<osm>')
+
+        for line in file_object:
+            if depth == 1 and line.lstrip().startswith(XML_ELEMENT_STARTS):
+                safe_offset = position
+            position += len(line)
+
+            parser.feed(line)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    depth += 1
+                    if depth == 1:
+                        root = elem
+                    elif depth == 2:
+                        element_offset = safe_offset
+                    continue
+
+                depth -= 1
+                if depth != 1:
+                    continue
+
+                element = _xml_element(elem)
+                root.clear()
+                if element is not None:
+                    yield element_offset, element
+
+    parser.close()
+
+
+def _xml_element(elem):
+    if elem.tag == 'node':
+        return OsmNode(int(elem.get('id')), elem.get('lat'), elem.get('lon'), _xml_tags(elem))
+
+    if elem.tag == 'way':
+        return OsmWay(int(elem.get('id')), [int(nd.get('ref')) for nd in elem.iter('nd')], _xml_tags(elem))
+
+    if elem.tag == 'relation':
+        members = [OsmMember(member.get('type'), int(member.get('ref')), member.get('role'))
+                   for member in elem.iter('member')]
+        return OsmRelation(int(elem.get('id')), members, _xml_tags(elem))
+
+    return None
+
+
+def _xml_tags(elem):
+    return [(tag.get('k'), tag.get('v')) for tag in elem.iter('tag')]
+
+
+def read_osm_pbf(file, processes=1, window=None, offset=0):
+    """
+    Read the PBF file block by block. Every block is decoded independently, so the blocks can
+    be decoded in a pool of processes, the order of the blocks is kept.
+    The offset of an element is the beginning of its block.
+    :param file:
+    :param processes:
+    :param window: the quantity of blocks decoded at the same time
+    :param offset:
+    :return: a generator of (offset, OsmNode | OsmWay | OsmRelation)
+    """
+    blocks = pbf_blocks(file, offset)
+
+    if processes <= 1:
+        for block_offset, data_offset, size in blocks:
+            for element in decode_pbf_block(file, data_offset, size):
+                yield block_offset, element
+        return
+
+    window = window or processes * 4
+    with Pool(processes) as pool:
+        pending = None
+        while True:
+            block_offsets, tasks = [], []
+            for block_offset, data_offset, size in _take(blocks, window):
+                block_offsets.append(block_offset)
+                tasks.append((file, data_offset, size))
+            result = pool.starmap_async(decode_pbf_block, tasks) if tasks else None
+
+            if pending is not None:
+                pending_offsets, pending_result = pending
+                for block_offset, elements in zip(pending_offsets, pending_result.get()):
+                    for element in elements:
+                        yield block_offset, element
+
+            if result is None:
+                break
+            pending = block_offsets, result
+
+
+def _take(iterator, quantity):
+    for _ in range(quantity):
+        try:
+            yield next(iterator)
+        except StopIteration:
+            return
+
+
+def pbf_blocks(file, offset=0):
+    """
+    Read only the headers of the file
+    :param file:
+    :param offset: the offset of a block header
+    :return: a generator of (block offset, data offset, size) of every blob with OSM data
+    """
+    with open(file, 'rb') as file_object:
+        file_object.seek(offset)
+        while True:
+            block_offset = file_object.tell()
+            length = file_object.read(4)
+            if not length:
+                return
+            if len(length) < 4:
+                raise ValueError("Truncated PBF file")
+
+            header_size = struct.unpack('!I', length)[0]
+            if header_size > PBF_MAX_HEADER_SIZE:
+                raise ValueError("Invalid PBF header size %d" % header_size)
+
+            block_type, data_size = None, 0
+            for number, _, value in _fields(file_object.read(header_size)):
+                if number == 1:
+                    block_type = bytes(value).decode('utf-8')
+                elif number == 3:
+                    data_size = value
+
+            if data_size > PBF_MAX_BLOB_SIZE:
+                raise ValueError("Invalid PBF blob size %d" % data_size)
+
+            data_offset = file_object.tell()
+            file_object.seek(data_size, 1)
+
+            if block_type == 'OSMData':
+                yield block_offset, data_offset, data_size
+
+
+def decode_pbf_block(file, offset, size):
+    """
+    Read and decode one blob of the file
+    :param file:
+    :param offset:
+    :param size:
+    :return: the list of the elements of the block
+    """
+    with open(file, 'rb') as file_object:
+        file_object.seek(offset)
+        blob = file_object.read(size)
+
+    return decode_primitive_block(_blob_data(blob))
+
+
+def _blob_data(blob):
+    raw = zlib_data = None
+    for number, _, value in _fields(blob):
+        if number == 1:
+            raw = value
+        elif number == 3:
+            zlib_data = value
+        elif number in (4, 5, 6, 7):
+            raise ValueError("PBF compression not supported, only zlib")
+
+    if zlib_data is not None:
+        return zlib.decompress(zlib_data)
+
+    return bytes(raw)
+
+
+def decode_primitive_block(data):
+    """
+    Decode a PrimitiveBlock with its string table and its groups
+    :param data:
+    :return:
+    """
+    strings = []
+    groups = []
+    granularity = 100
+    lat_offset = lon_offset = 0
+
+    for number, _, value in _fields(data):
+        if number == 1:
+            strings = [bytes(s).decode('utf-8') for n, _, s in _fields(value) if n == 1]
+        elif number == 2:
+            groups.append(value)
+        elif number == 17:
+            granularity = value
+        elif number == 19:
+            lat_offset = _int64(value)
+        elif number == 20:
+            lon_offset = _int64(value)
+
+    def coordinate(offset, value):
+        # nanodegrees to the precision of the Node model
+        return '%.7f' % ((offset + granularity * value) / 1e9)
+
+    elements = []
+    for group in groups:
+        for number, _, value in _fields(group):
+            if number == 1:
+                elements.append(_decode_node(value, strings, lat_offset, lon_offset, coordinate))
+            elif number == 2:
+                elements.extend(_decode_dense_nodes(value, strings, lat_offset, lon_offset, coordinate))
+            elif number == 3:
+                elements.append(_decode_way(value, strings))
+            elif number == 4:
+                elements.append(_decode_relation(value, strings))
+
+    return elements
+
+
+def _decode_node(data, strings, lat_offset, lon_offset, coordinate):
+    node_id = latitude = longitude = 0
+    keys, values = [], []
+    for number, wire, value in _fields(data):
+        if number == 1:
+            node_id = _zigzag(value)
+        elif number == 2:
+            keys.extend(_repeated(wire, value))
+        elif number == 3:
+            values.extend(_repeated(wire, value))
+        elif number == 8:
+            latitude = _zigzag(value)
+        elif number == 9:
+            longitude = _zigzag(value)
+
+    tags = [(strings[k], strings[v]) for k, v in zip(keys, values)]
+    return OsmNode(node_id, coordinate(lat_offset, latitude), coordinate(lon_offset, longitude), tags)
+
+
+def _decode_dense_nodes(data, strings, lat_offset, lon_offset, coordinate):
+    ids, latitudes, longitudes, keys_values = [], [], [], []
+    for number, wire, value in _fields(data):
+        if number == 1:
+            ids.extend(_zigzag(v) for v in _repeated(wire, value))
+        elif number == 8:
+            latitudes.extend(_zigzag(v) for v in _repeated(wire, value))
+        elif number == 9:
+            longitudes.extend(_zigzag(v) for v in _repeated(wire, value))
+        elif number == 10:
+            keys_values.extend(_repeated(wire, value))
+
+    nodes = []
+    node_id = latitude = longitude = 0
+    position = 0
+    for delta_id, delta_latitude, delta_longitude in zip(ids, latitudes, longitudes):
+        node_id += delta_id
+        latitude += delta_latitude
+        longitude += delta_longitude
+
+        # The tags of every node are pairs of keys and values ended by 0
+        tags = []
+        while position < len(keys_values) and keys_values[position] != 0:
+            tags.append((strings[keys_values[position]], strings[keys_values[position + 1]]))
+            position += 2
+        position += 1
+
+        nodes.append(OsmNode(node_id, coordinate(lat_offset, latitude), coordinate(lon_offset, longitude), tags))
+
+    return nodes
+
+
+def _decode_way(data, strings):
+    way_id = 0
+    keys, values, refs = [], [], []
+    for number, wire, value in _fields(data):
+        if number == 1:
+            way_id = _int64(value)
+        elif number == 2:
+            keys.extend(_repeated(wire, value))
+        elif number == 3:
+            values.extend(_repeated(wire, value))
+        elif number == 8:
+            refs.extend(_zigzag(v) for v in _repeated(wire, value))
+
+    return OsmWay(way_id, _delta_decode(refs), [(strings[k], strings[v]) for k, v in zip(keys, values)])
+
+
+def _decode_relation(data, strings):
+    relation_id = 0
+    keys, values, roles, memids, types = [], [], [], [], []
+    for number, wire, value in _fields(data):
+        if number == 1:
+            relation_id = _int64(value)
+        elif number == 2:
+            keys.extend(_repeated(wire, value))
+        elif number == 3:
+            values.extend(_repeated(wire, value))
+        elif number == 8:
+            roles.extend(_repeated(wire, value))
+        elif number == 9:
+            memids.extend(_zigzag(v) for v in _repeated(wire, value))
+        elif number == 10:
+            types.extend(_repeated(wire, value))
+
+    members = [OsmMember(PBF_MEMBER_TYPES[member_type], ref, strings[role])
+               for member_type, ref, role in zip(types, _delta_decode(memids), roles)]
+
+    return OsmRelation(relation_id, members, [(strings[k], strings[v]) for k, v in zip(keys, values)])
+
+
+def _delta_decode(deltas):
+    values = []
+    current = 0
+    for delta in deltas:
+        current += delta
+        values.append(current)
+
+    return values
+
+
+"""
+Protocol buffers wire format, only what we need for read the PBF files.
+Reference: https://developers.google.com/protocol-buffers/docs/encoding
+"""
+
+
+def _varint(data, position):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, position
+        shift += 7
+
+
+def _fields(data):
+    """
+
+    :param data: a protobuf message
+    :return: a generator of (field number, wire type, value)
+    """
+    data = memoryview(data)
+    position = 0
+    end = len(data)
+    while position < end:
+        key, position = _varint(data, position)
+        wire = key & 0x07
+
+        if wire == 0:
+            value, position = _varint(data, position)
+        elif wire == 2:
+            length, position = _varint(data, position)
+            value = data[position:position + length]
+            position += length
+        elif wire == 1:
+            value = data[position:position + 8]
+            position += 8
+        elif wire == 5:
+            value = data[position:position + 4]
+            position += 4
+        else:
+            raise ValueError("Unsupported protobuf wire type %d" % wire)
+
+        yield key >> 3, wire, value
+
+
+def _repeated(wire, value):
+    """
+    The repeated fields are usually packed, but they can be written one by one
+    :param wire:
+    :param value:
+    :return: the list of varints
+    """
+    if wire == 0:
+        return [value]
+
+    values = []
+    position = 0
+    end = len(value)
+    while position < end:
+        varint, position = _varint(value, position)
+        values.append(varint)
+
+    return values
+
+
+def _zigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def _int64(value):
+    return value - (1 << 64) if value >= (1 << 63) else value
@@ -0,0 +1,144 @@
+from abc import ABCMeta, abstractmethod
+from datetime import datetime
+from django.db.models import F
+from services.models import Parameters, ParametersVersion
+
+"""
+Caches of tables for the process. A table is loaded in one query, and it is loaded again when
+its version (ParametersVersion) changes. The version is read at most every VERSION_CHECK_INTERVAL
+seconds.
+"""
+
+PARAMETERS_VERSION_ID = 1
+VERSION_CHECK_INTERVAL = 30
+
+
+class VersionedCache(metaclass=ABCMeta):
+    """
+    Base of the caches, the subclasses load the values with load_values
+    """
+
+    def __init__(self, version_id, check_interval=VERSION_CHECK_INTERVAL):
+        """
+
+        :param version_id: the id of the row of ParametersVersion of the table
+        :param check_interval: the seconds between two reads of the version
+        """
+        self.version_id = version_id
+        self.check_interval = check_interval
+        self._values = None
+        self._version = None
+        self._checked = None
+
+    def get_values(self):
+        """
+
+        :return: the values in cache, loaded again if the version has changed
+        """
+        if self._values is None or self._is_expired():
+            self.load()
+
+        return self._values
+
+    def load(self):
+        """
+        Load all the values and the version
+        :return:
+        """
+        self._version = get_version(self.version_id)
+        self._values = self.load_values()
+        self._checked = datetime.now()
+
+    @abstractmethod
+    def load_values(self):
+        """
+
+        :return: all the values of the table
+        """
+
+    def invalidate(self):
+        """
+        The values will be loaded again at the next read
+        :return:
+        """
+        self._values = None
+
+    def _is_expired(self):
+        """
+
+        :return: True if the version of the table has changed
+        """
+        if (datetime.now() - self._checked).total_seconds() < self.check_interval:
+            return False
+
+        self._checked = datetime.now()
+        return get_version(self.version_id) != self._version
+
+
+class ParametersCache(VersionedCache):
+
+    def __init__(self, check_interval=VERSION_CHECK_INTERVAL):
+        super().__init__(PARAMETERS_VERSION_ID, check_interval)
+
+    def load_values(self):
+        """
+
+        :return: dict with the value of every parameter
+        """
+        return dict(Parameters.objects.values_list('name', 'value'))
+
+    def get(self, name, type_value=str):
+        """
+
+        :param name: the name of the parameter
+        :param type_value: the function which converts the value (str, int, float, Decimal)
+        :return: the value of the parameter
+        """
+        try:
+            return type_value(self.get_values()[name])
+        except KeyError:
+            raise Parameters.DoesNotExist("The parameter %s does not exist." % name)
+
+
+def get_version(version_id=PARAMETERS_VERSION_ID):
+    """
+
+    :param version_id:
+    :return: the version of the table
+    """
+    version = ParametersVersion.objects.filter(pk=version_id).values_list('version', flat=True).first()
+    return version or 0
+
+
+def increment_version(version_id=PARAMETERS_VERSION_ID):
+    """
+    Increment the version of a table, all the processes load again the table
+    :param version_id:
+    :return:
+    """
+    if not ParametersVersion.objects.filter(pk=version_id).update(version=F('version') + 1):
+        ParametersVersion.objects.create(id=version_id, version=1)
+
+
+def get_parameter(name, type_value=str):
+    """
+
+    :param name: the name of the parameter
+    :param type_value: the function which converts the value
+    :return: the value of the parameter from the cache of the process
+    """
+    return parameters_cache.get(name, type_value)
+
+
+def parameters_changed(sender, **kwargs):
+    """
+    Receiver of the signals post_save and post_delete of Parameters
+    :param sender:
+    :param kwargs:
+    :return:
+    """
+    increment_version(PARAMETERS_VERSION_ID)
+    parameters_cache.invalidate()
+
+
+parameters_cache = ParametersCache()
@@ -0,0 +1,119 @@
+import json
+import requests
+from django.conf import settings
+from services.models import FeatureSynonyms
+from services.classes.parameters_cache import get_parameter
+
+"""
+Local store of the synonyms of the names of the feature codes. The synonyms are read from the
+table FeatureSynonyms once by process, a name not in the table is searched in the synonyms API
+and saved, except in the cache only mode where the matching does not use the network.
+"""
+
+NO_SYNONYMS_NAMES = ('fourth-order administrative division',)
+
+
+class SynonymsStore:
+
+    def __init__(self, cache_only=None, timeout=None):
+        """
+
+        :param cache_only: never call the API, by default the setting SYNONYMS_CACHE_ONLY
+        :param timeout: the timeout in seconds of the API, by default the setting SYNONYMS_API_TIMEOUT
+        """
+        self.cache_only = getattr(settings, 'SYNONYMS_CACHE_ONLY', False) if cache_only is None else cache_only
+        self.timeout = getattr(settings, 'SYNONYMS_API_TIMEOUT', 5) if timeout is None else timeout
+        self._synonyms = None
+
+    def get(self, feature_name):
+        """
+
+        :param feature_name: the name of the feature code
+        :return: the list of the synonyms of the name
+        """
+        if self._synonyms is None:
+            self.load()
+
+        if feature_name in self._synonyms:
+            return self._synonyms[feature_name]
+
+        if self.cache_only or feature_name in NO_SYNONYMS_NAMES:
+            return []
+
+        synonyms = request_synonyms(feature_name, self.timeout)
+        if synonyms is None:
+            """
+            The API is not available, the name is not searched again by this process
+            """
+            self._synonyms[feature_name] = []
+            return []
+
+        self.save(feature_name, synonyms)
+        return synonyms
+
+    def load(self):
+        """
+        Load all the synonyms of the table
+        :return:
+        """
+        self._synonyms = {feature_name: json.loads(synonyms) for feature_name, synonyms in
+                          FeatureSynonyms.objects.values_list('feature_name', 'synonyms')}
+
+    def save(self, feature_name, synonyms):
+        """
+        Keep the synonyms of a name in the table and in memory
+        :param feature_name:
+        :param synonyms: list of synonyms
+        :return:
+        """
+        FeatureSynonyms.objects.update_or_create(feature_name=feature_name,
+                                                 defaults={'synonyms': json.dumps(synonyms)})
+        if self._synonyms is not None:
+            self._synonyms[feature_name] = synonyms
+
+
+def request_synonyms(feature_name, timeout):
+    """
+    We search synonyms with the marshape api urban
+    Reference: https://market.mashape.com/community/urban-dictionary
+
+    :param feature_name:
+    :param timeout: the timeout of the request in seconds
+    :return: the list of synonyms, None if the API is not available
+    """
+    param_api_url = get_parameter('api_synonyms_url')
+    param_api_hash_key = get_parameter('api_synonyms_hash_key')
+    param_api_hash_value = get_parameter('api_synonyms_hash_value')
+
+    try:
+        r = requests.get(param_api_url + feature_name, headers={param_api_hash_key: param_api_hash_value},
+                         timeout=timeout)
+        r.raise_for_status()
+
+        json_object = json.loads(r.text)
+        return json_object["tags"]
+    except Exception as error:
+        print("Error synonyms service" + str(error))
+
+    return None
+
+
+def get_synonyms(feature_name):
+    """
+
+    :param feature_name: the name of the feature code
+    :return: the synonyms of the name from the store of the process
+    """
+    return synonyms_store.get(feature_name)
+
+
+def set_cache_only(cache_only=True):
+    """
+    In the cache only mode the synonyms API is not called
+    :param cache_only:
+    :return:
+    """
+    synonyms_store.cache_only = cache_only
+
+
+synonyms_store = SynonymsStore()
@@ -18,6 +18,7 @@ class BackgroundProcess(threading.Thread):
         self.positional_params = kwargs.get('positional_params')
         self.others_params = kwargs.get('others_params')
         self.provider = kwargs.get('provider')
+        self.resume = kwargs.get('resume', False)
 
     def run(self):
         """
@@ -30,7 +31,7 @@ class BackgroundProcess(threading.Thread):
                 call_command(self.process)
             elif self.process == SCHEDULED_WORK_IMPORTATION_PROCESS:
                 path = Parameters.objects.only('value').get(name='directory_path_importation').value
-                call_command(self.process, path + self.positional_params, skip_geonames=True)
+                call_command(self.process, path + self.positional_params, skip_geonames=True, resume=self.resume)
 
         except Exception as error:
             print("Error: " + str(error))
@@ -0,0 +1,73 @@
+from services.models import CorrespondenceTypes, CorrespondenceTypesClose, CorrespondenceTypesInvalid
+from services.classes.parameters_cache import VersionedCache, increment_version
+
+"""
+Index in memory of the correspondences between the types of GeoNames and the tags OSM, for the
+alignment. For every type (gn_feature_class, gn_feature_code), a dict gives the status of every
+tag (osm_key, osm_value): a total correspondence, a close correspondence or an invalid one.
+"""
+
+TYPES_VERSION_ID = 2
+
+TOTAL = 'TOTAL'
+CLOSE = 'CLOSE'
+INVALID = 'INVALID'
+
+NO_STATUS = frozenset()
+
+
+class TypeCorrespondenceCache(VersionedCache):
+
+    def __init__(self):
+        super().__init__(TYPES_VERSION_ID)
+
+    def load_values(self):
+        """
+        Load the three tables of correspondences between types, only the invalid correspondences active
+        :return: dict {(gn_feature_class, gn_feature_code): {(osm_key, osm_value): set of status}}
+        """
+        index = {}
+        tables = ((TOTAL, CorrespondenceTypes.objects.all()),
+                  (CLOSE, CorrespondenceTypesClose.objects.all()),
+                  (INVALID, CorrespondenceTypesInvalid.objects.filter(active=True)))
+
+        for status, queryset in tables:
+            for feature_class, feature_code, osm_key, osm_value in \
+                    queryset.values_list('gn_feature_class', 'gn_feature_code', 'osm_key', 'osm_value'):
+                index.setdefault((feature_class, feature_code), {}).setdefault((osm_key, osm_value), set()).add(status)
+
+        return index
+
+    def get_tags(self, feature_class, feature_code):
+        """
+
+        :param feature_class:
+        :param feature_code:
+        :return: dict with the status of the tags for the type
+        """
+        return self.get_values().get((feature_class, feature_code), {})
+
+
+def get_type_tags(feature_class, feature_code):
+    """
+
+    :param feature_class:
+    :param feature_code:
+    :return: dict {(osm_key, osm_value): set of status} of the type from the cache of the process
+    """
+    return types_cache.get_tags(feature_class, feature_code)
+
+
+def types_changed(sender=None, **kwargs):
+    """
+    Receiver of the signals post_save and post_delete of the correspondences between types, it is
+    also called after the updates without signals
+    :param sender:
+    :param kwargs:
+    :return:
+    """
+    increment_version(TYPES_VERSION_ID)
+    types_cache.invalidate()
+
+
+types_cache = TypeCorrespondenceCache()
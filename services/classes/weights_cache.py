@@ -0,0 +1,93 @@
+from services.models import ParametersScorePertinence
+from services.classes.parameters_cache import VersionedCache, increment_version
+
+"""
+Index in memory of the weights of the pertinence score. Every type of GeoNames (gn_feature_class,
+gn_feature_code) with its own active weights has them, the other types have the active global
+weights.
+"""
+
+WEIGHTS_VERSION_ID = 3
+
+
+class WeightResolver(VersionedCache):
+
+    def __init__(self):
+        super().__init__(WEIGHTS_VERSION_ID)
+
+    def load_values(self):
+        """
+        Load the active weights, if a type has many active weights the last ones are kept
+        :return: dict {(gn_feature_class, gn_feature_code): (params, (weight_name, weight_type, weight_coordinates))},
+        the global weights have the key None
+        """
+        weights = {}
+        for params in ParametersScorePertinence.objects.filter(active=True).order_by('id'):
+            if params.name == 'weight_matching_global' and params.all_types:
+                weights[None] = (params, get_weight_triple(params))
+            elif params.name == 'weight_matching' and not params.all_types:
+                weights[(params.gn_feature_class, params.gn_feature_code)] = (params, get_weight_triple(params))
+
+        return weights
+
+    def resolve(self, feature_class, feature_code):
+        """
+
+        :param feature_class:
+        :param feature_code:
+        :return: the weights (ParametersScorePertinence) of the type, and the triple of their values
+        """
+        weights = self.get_values()
+
+        try:
+            return weights[(feature_class, feature_code)]
+        except KeyError:
+            pass
+
+        try:
+            return weights[None]
+        except KeyError:
+            raise ParametersScorePertinence.DoesNotExist("There are not active global weights.")
+
+    def resolve_type(self, feature_class, feature_code):
+        """
+
+        :param feature_class:
+        :param feature_code:
+        :return: the weights of the type and the triple of their values, None if the type has not its own weights
+        """
+        return self.get_values().get((feature_class, feature_code))
+
+
+def get_weight_triple(params):
+    """
+
+    :param params: ParametersScorePertinence
+    :return: (weight_name, weight_type, weight_coordinates) as floats
+    """
+    return float(params.weight_name), float(params.weight_type), float(params.weight_coordinates)
+
+
+def get_weights(feature_class, feature_code):
+    """
+
+    :param feature_class:
+    :param feature_code:
+    :return: the weights of the type and the triple of their values, from the cache of the process
+    """
+    return weight_resolver.resolve(feature_class, feature_code)
+
+
+def weights_changed(sender=None, **kwargs):
+    """
+    Receiver of the signals post_save and post_delete of ParametersScorePertinence, it is also
+    called after the updates without signals
+    :param sender:
+    :param kwargs:
+    :return:
+    """
+    increment_version(WEIGHTS_VERSION_ID)
+    weight_resolver.invalidate()
+
+
+weight_resolver = WeightResolver()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from services.models import Geonames, Node, Parameters
+from services.algorithms.geolocation import GeoLocation
+from services.algorithms.algorithm_blocking import get_nodes_in_ratio_query
+
+"""
+The query of the blocking before the bounding box on the columns, the functions on the columns
+do not allow the use of the index (latitude, longitude)
+"""
+LEGACY_QUERY = "SELECT id FROM services_node n WHERE RADIANS(latitude) >= %(lat_min)s AND RADIANS(latitude) <= " \
+               "%(lat_max)s AND (RADIANS(longitude) >= %(long_min)s {0} RADIANS(longitude) <= %(long_max)s) " \
+               "AND ACOS(SIN(%(lat_loc)s) * SIN(RADIANS(latitude)) + COS(%(lat_loc)s) * COS(RADIANS(latitude)) " \
+               "* COS(RADIANS(longitude) - %(long_loc)s)) <= %(ang_radius)s"
+
+
+class Command(BaseCommand):
+    help = 'This process compares the plans (EXPLAIN) and the times of the query of the blocking with ' \
+           'the bounding box on the columns against the old query.'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '--samples',
+            default=20,
+            type=int,
+            metavar="int",
+            dest='samples',
+            help="The quantity of GeoNames entities tested")
+
+        parser.add_argument(
+            '--radium-search',
+            default=False,
+            metavar="int",
+            dest='radium-search',
+            help="The search ratio for the blocking")
+
+    def handle(self, *args, **options):
+        try:
+            ratio = options['radium-search']
+            if ratio:
+                ratio = float(ratio)
+            else:
+                ratio = float(Parameters.objects.get(name='search_radius_for_blocking').value)
+
+            cursor = connection.cursor()
+            indexes = get_indexes(cursor, Node._meta.db_table)
+            box_index = indexes.get(('latitude', 'longitude'))
+            cell_index = indexes.get(('cell',))
+            if box_index is None:
+                raise CommandError("The index (latitude, longitude) of services_node does not exist")
+
+            entities = Geonames.objects.only('id', 'latitude', 'longitude').order_by('?')[:options['samples']]
+
+            times = {'box': 0, 'legacy': 0}
+            without_index = 0
+            for entity in entities:
+                loc = GeoLocation.from_degrees(entity.latitude, entity.longitude)
+                query, params = get_nodes_in_ratio_query(loc, ratio)
+                legacy_query, legacy_params = get_legacy_query(loc, ratio)
+
+                plan = explain(cursor, query, params)
+                legacy_plan = explain(cursor, legacy_query, legacy_params)
+
+                """
+                The query with the cells of the spatial grid can use the index of the cells instead
+                """
+                expected = {box_index, cell_index} if 'cell IN' in query else {box_index}
+                possible_keys = set((plan['possible_keys'] or '').split(','))
+                if plan['type'] != 'range' or plan['key'] not in expected or not expected & possible_keys:
+                    without_index += 1
+
+                self.stdout.write("Entity %s: box [type=%s, key=%s, rows=%s] legacy [type=%s, key=%s, rows=%s]" %
+                                  (entity.id, plan['type'], plan['key'], plan['rows'], legacy_plan['type'],
+                                   legacy_plan['key'], legacy_plan['rows']))
+
+                times['box'] += execution_time(cursor, query, params)
+                times['legacy'] += execution_time(cursor, legacy_query, legacy_params)
+
+            quantity = len(entities) or 1
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                "Average time: box %.4f s, legacy %.4f s" % (times['box'] / quantity, times['legacy'] / quantity)))
+
+            if without_index:
+                raise CommandError("%d queries of the blocking do not use the index %s (latitude, longitude) "
+                                   "as a range" % (without_index, box_index))
+
+            self.stdout.write(self.style.SUCCESS("The index %s (latitude, longitude) is used by all the queries." %
+                                                 box_index))
+
+        except CommandError:
+            raise
+        except Exception as error:
+            raise CommandError(error)
+
+
+def get_legacy_query(loc, ratio):
+    """
+    The query and the parameters of the blocking with the functions on the columns
+    :param loc: the GeoLocation of the entity
+    :param ratio: the distance in kilometers
+    :return:
+    """
+    (min_loc, max_loc) = loc.bounding_locations(ratio)
+    (lat_min, long_min) = min_loc.get_radians_coordinates()
+    (lat_max, long_max) = max_loc.get_radians_coordinates()
+    lat_loc, long_loc = loc.get_radians_coordinates()
+
+    query = LEGACY_QUERY.format("OR" if loc.meridian180_within_distance(ratio) else "AND")
+    params = {
+        'lat_min': lat_min,
+        'long_min': long_min,
+        'lat_max': lat_max,
+        'long_max': long_max,
+        'lat_loc': lat_loc,
+        'long_loc': long_loc,
+        'ang_radius': loc.get_angular_radius(distance=ratio)
+    }
+
+    return query, params
+
+
+def get_indexes(cursor, table):
+    """
+    :param cursor:
+    :param table:
+    :return: dict {tuple of the columns: name of the index} of the indexes of the table
+    """
+    cursor.execute("SHOW INDEX FROM {0}".format(table))
+    columns = [column[0] for column in cursor.description]
+
+    indexes = {}
+    for row in cursor.fetchall():
+        index = dict(zip(columns, row))
+        indexes.setdefault(index['Key_name'], []).append((index['Seq_in_index'], index['Column_name']))
+
+    return {tuple(column for _, column in sorted(index_columns)): name for name, index_columns in indexes.items()}
+
+
+def explain(cursor, query, params):
+    """
+    :param cursor:
+    :param query:
+    :param params:
+    :return: the row of the plan of the table services_node
+    """
+    cursor.execute("EXPLAIN " + query, params)
+    columns = [column[0] for column in cursor.description]
+    return dict(zip(columns, cursor.fetchone()))
+
+
+def execution_time(cursor, query, params):
+    """
+    :param cursor:
+    :param query:
+    :param params:
+    :return: the time in seconds of the query with all its rows
+    """
+    begin = datetime.now()
+    cursor.execute(query, params)
+    cursor.fetchall()
+    return (datetime.now() - begin).total_seconds()
@@ -1,9 +1,16 @@
 # !/usr/bin/env python3
 from django.core.management.base import BaseCommand, CommandError
-from services.models import Geonames, ScheduledWork, PENDING, INPROGRESS, FINALIZED, ERROR, \
+from services.models import ScheduledWork, PENDING, INPROGRESS, FINALIZED, ERROR, \
     SCHEDULED_WORK_CORRESPONDENCE_PROCESS
+from services.algorithms.algorithm_matching import match_partition, set_spatial_index, unchecked_geonames
+from services.algorithms.spatial_index import SpatialIndex, padded_region
+from services.algorithms.algorithm_blocking import set_name_pruning
+from services.algorithms.algorithm_name_index import is_name_index_complete
+from services.classes.parameters_cache import get_parameter
+from services.classes.synonyms_store import set_cache_only
 from datetime import datetime
-from django.core.management import call_command
+from django.db import connections
+from multiprocessing import Pool
 from django.utils import timezone
 
 __author__ = 'Amaia Nazabal'
@@ -12,6 +19,63 @@ __author__ = 'Amaia Nazabal'
 class Command(BaseCommand):
     help = ''
 
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '--spatial-index',
+            action='store_true',
+            dest='spatial-index',
+            default=False,
+            help="Load the nodes in a spatial index in memory for the blocking, instead of one query "
+                 "to the database by entity")
+
+        parser.add_argument(
+            '--region',
+            default=None,
+            metavar="lat_min,long_min,lat_max,long_max",
+            dest='region',
+            help="The region of the GeoNames entities matched, all the entities by default. The spatial index "
+                 "loads the nodes of the region and of its border in the search ratio")
+
+        parser.add_argument(
+            '--batch-size',
+            default=1000,
+            type=int,
+            metavar="int",
+            dest='batch-size',
+            help="The quantity of GeoNames entities read together, and searched together in the spatial index")
+
+        parser.add_argument(
+            '--partition-size',
+            default=10000,
+            type=int,
+            metavar="int",
+            dest='partition-size',
+            help="The quantity of GeoNames entities matched by a process before it reports its progress")
+
+        parser.add_argument(
+            '--name-first',
+            action='store_true',
+            dest='name-first',
+            default=False,
+            help="Keep in the blocking only the named entities whose name can reach the minimum similarity "
+                 "of the alignment, with the index of the names (./manage.py named-entities)")
+
+        parser.add_argument(
+            '--synonyms-cache-only',
+            action='store_true',
+            dest='synonyms-cache-only',
+            default=False,
+            help="Use only the local store of synonyms (./manage.py synonyms), without the synonyms API")
+
+        parser.add_argument(
+            '--workers',
+            default=1,
+            type=int,
+            metavar="int",
+            dest='workers',
+            help="The quantity of processes of the matching")
+
     def handle(self, *args, **options):
 
         self.stdout.write(
@@ -20,9 +84,13 @@ class Command(BaseCommand):
         scheduled_work = ScheduledWork.objects.get(name=SCHEDULED_WORK_CORRESPONDENCE_PROCESS, status=PENDING)
 
         try:
-            geonames_entities = Geonames.objects.only('id').filter(correspondence_check=False).values()
+            region = None
+            if options['region']:
+                region = [float(value) for value in options['region'].split(',')]
+
+            ids = list(unchecked_geonames(region).order_by('id').values_list('id', flat=True))
 
-            total_rows = len(geonames_entities)
+            total_rows = len(ids)
 
             '''
             On garde le processus dans la table avec l'état PENDING
@@ -32,20 +100,67 @@ class Command(BaseCommand):
             scheduled_work.initial_date = timezone.now()
             scheduled_work.save()
 
-            for geonames_entity in geonames_entities:
-                geonames_entity_id = geonames_entity['id']
-
-                try:
-                    call_command('correspondance', geonames_entity_id)
-
-                    scheduled_work.affected_rows += 1
+            search_ratio = get_parameter('search_radius_for_blocking', float)
+
+            if options['synonyms-cache-only']:
+                set_cache_only(True)
+
+            if options['name-first']:
+                """
+                Without the index, or with names not indexed, the pruning would remove all the entities
+                """
+                if not is_name_index_complete():
+                    raise Exception("The index of the names is not complete, execute ./manage.py named-entities "
+                                    "before the option --name-first")
+                set_name_pruning(True)
+
+            if options['spatial-index']:
+                """
+                The nodes in the ratio of the entities near the border are outside of the region
+                """
+                set_spatial_index(SpatialIndex.from_database(None if region is None else
+                                                             padded_region(region, search_ratio)))
+
+            """
+            The entities are partitioned in ranges of ids, every range is matched by one process
+            """
+            batch_size = options['batch-size']
+            partition_size = options['partition-size']
+            tasks = [(ids[begin], ids[min(begin + partition_size, total_rows) - 1], search_ratio, batch_size,
+                      region) for begin in range(0, total_rows, partition_size)]
+
+            workers = options['workers']
+            if workers > 1:
+                """
+                Every process opens its own connection to the DB
+                """
+                connections.close_all()
+                pool = Pool(workers)
+                results = pool.imap_unordered(match_partition, tasks)
+            else:
+                pool = None
+                results = map(match_partition, tasks)
+
+            begin = datetime.now()
+            try:
+                for affected, errors in results:
+                    scheduled_work.affected_rows += affected
+                    scheduled_work.error_rows += len(errors)
                     scheduled_work.save()
 
-                except Exception as error:
-                    scheduled_work.error_rows += 1
-                    scheduled_work.save()
-                    raise CommandError('%s Error: %s.Entity id %s' %
-                                       (datetime.now(), str(error), geonames_entity_id))
+                    for geonames_entity_id, error in errors:
+                        self.stdout.write(self.style.ERROR('%s Error: %s.Entity id %s' %
+                                                           (datetime.now(), error, geonames_entity_id)))
+
+                    done = scheduled_work.affected_rows + scheduled_work.error_rows
+                    elapsed = (datetime.now() - begin).total_seconds()
+                    print("%s INFO: %d/%d entities matched (%.1f entities/s)." %
+                          (datetime.now(), done, total_rows, done / elapsed if elapsed else 0))
+            finally:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+                set_spatial_index(None)
 
             if scheduled_work.error_rows == scheduled_work.affected_rows:
                 scheduled_work.status = ERROR
@@ -5,6 +5,7 @@ from services.models import Relation, Tag, Node, Way, Geonames, FeatureCode, REL
     SCHEDULED_WORK_IMPORTATION_PROCESS, PENDING, ERROR, FINALIZED, INPROGRESS
 import xml.etree.ElementTree as ET
 from util.util import get_name_shape
+from util.spatial_grid import get_cell
 from datetime import datetime
 from django.utils import timezone
 
@@ -249,7 +250,7 @@ def nodes_importation(xml_point, xml_tags):
     """
 
     point = Node(id=xml_point.get('id'), latitude=xml_point.get('lat'),
-                 longitude=xml_point.get('lon'))
+                 longitude=xml_point.get('lon'), cell=get_cell(xml_point.get('lat'), xml_point.get('lon')))
     point.save()
 
     count_tags = 0
@@ -2,12 +2,52 @@
 
 from django.core.management.base import BaseCommand, CommandError
 from services.models import Relation, Tag, Node, Way, Geonames, FeatureCode, RELATION, NODE, WAY, ScheduledWork, \
-    SCHEDULED_WORK_IMPORTATION_PROCESS, PENDING, ERROR, FINALIZED, INPROGRESS
-import xml.etree.ElementTree as ET
+    SCHEDULED_WORK_IMPORTATION_PROCESS, PENDING, ERROR, FINALIZED, INPROGRESS, MemberForImport, ImportationCheckpoint, \
+    NameVariant
 from util.util import get_name_shape
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from multiprocessing import Pool
 from django.utils import timezone
-from django.db import connection
+from django.db import connection, connections, transaction
+import os
+from services.classes.bulk_writer import BulkWriter, FlushError, bulk_insert_ignore
+from services.classes.osm_reader import read_osm_file, OsmNode, OsmWay, OsmRelation
+from services.classes.named_filter import NamedEntitiesFilter
+from util.spatial_grid import get_cell
+from services.algorithms.algorithm_cleaning import clean_entities_without_name as clean_osm_entities
+from services.algorithms.algorithm_roots import calculate_roots
+from services.algorithms.algorithm_named_entities import refresh_named_entities
+from services.algorithms.algorithm_name_index import refresh_name_index
+from services.algorithms.algorithm_name_variants import geonames_variants, osm_variants
+
+DEFAULT_BATCH_SIZE = 5000
+MEMBERSHIP_CHUNK_SIZE = 100000
+GEONAMES_CHUNK_SIZE = 64 * 1024 * 1024
+
+ELEMENT_TYPES = {OsmNode: NODE, OsmWay: WAY, OsmRelation: RELATION}
+ELEMENT_ORDER = {NODE: 0, WAY: 1, RELATION: 2}
+
+# The updates applied with the staged memberships, by type of parent and type of member. If a member is
+# in many parents, the last membership read (the greatest id, LATEST_MEMBERSHIPS) is applied.
+LATEST_MEMBERSHIPS = "(SELECT reference, MAX(id) AS id FROM services_memberforimport WHERE parent_type = %s " \
+                     "AND type = %s AND id BETWEEN %s AND %s GROUP BY reference) l"
+
+MEMBERSHIP_UPDATES = {
+    WAY: [
+        (NODE, "UPDATE services_node n JOIN {0} ON l.reference = n.id JOIN services_memberforimport m ON m.id = l.id "
+               "SET n.way_reference_id = m.parent_reference"),
+    ],
+    RELATION: [
+        (NODE, "UPDATE services_node n JOIN {0} ON l.reference = n.id JOIN services_memberforimport m ON m.id = l.id "
+               "SET n.relation_reference_id = m.parent_reference, n.role = m.role"),
+        (WAY, "UPDATE services_way w JOIN {0} ON l.reference = w.id JOIN services_memberforimport m ON m.id = l.id "
+              "SET w.relation_reference_id = m.parent_reference, w.role = m.role"),
+        # The role of a relation is shorter than the role of the staging table
+        (RELATION, "UPDATE services_relation r JOIN {0} ON l.reference = r.id JOIN services_memberforimport m "
+                   "ON m.id = l.id SET r.relation_reference_id = m.parent_reference, r.role = LEFT(m.role, 20)"),
+    ]
+}
 
 
 class Command(BaseCommand):
@@ -20,7 +60,7 @@ class Command(BaseCommand):
             nargs='+',
             metavar="FILE",
             default=False,
-            help="The path of the XML file for the OSM importation"
+            help="The path of the XML or PBF file for the OSM importation"
         )
 
         parser.add_argument(
@@ -67,6 +107,42 @@ class Command(BaseCommand):
             help="Skip the clean of entities in osm"
         )
 
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            dest='batch-size',
+            metavar="int",
+            help="The quantity of rows written by transaction in the importation"
+        )
+
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            dest='processes',
+            metavar="int",
+            help="The quantity of processes for decode the blocks of a PBF file and for import the "
+                 "chunks of the GeoNames dump"
+        )
+
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            dest='resume',
+            default=False,
+            help="Resume the OSM importation of the file from its last checkpoint"
+        )
+
+        parser.add_argument(
+            '--only-named',
+            action='store_true',
+            dest='only-named',
+            default=False,
+            help="Import only the OSM entities with a name and the entities referenced by them, "
+                 "the file is scanned before the importation and the entities are not cleaned after"
+        )
+
     def handle(self, file, *args, **options):
         """
 
@@ -75,7 +151,7 @@ class Command(BaseCommand):
         :param options: 
         :return: 
         """
-        scheduled_work = ScheduledWork.objects.get(name=SCHEDULED_WORK_IMPORTATION_PROCESS, status=PENDING)
+        scheduled_work = get_scheduled_work(file[0], options['resume'])
 
         scheduled_work.status = INPROGRESS
         scheduled_work.initial_date = timezone.now()
@@ -83,6 +159,7 @@ class Command(BaseCommand):
         begin_process = datetime.now()
 
         try:
+            named_filter = None
 
             if not options['skip-osm']:
                 self.stdout.write(
@@ -90,21 +167,36 @@ class Command(BaseCommand):
 
                 print("%s INFO: File %s loaded." % (datetime.now(), file[0]))
 
-                osm_importation(self, file[0], scheduled_work)
-                clean_entities_without_name(self)
+                if options['only-named']:
+                    print("%s INFO: Scan of the entities with name." % datetime.now())
+                    named_filter = NamedEntitiesFilter.scan(file[0], options['processes'])
+                    print("%s INFO: %d nodes, %d ways and %d relations referenced by a name." %
+                          (datetime.now(), len(named_filter.nodes), len(named_filter.ways),
+                           len(named_filter.relations)))
+
+                osm_importation(self, file[0], scheduled_work, options['batch-size'], options['processes'],
+                                options['resume'], named_filter)
+
+                if named_filter is None:
+                    clean_entities_without_name(self)
+
+                roots_importation(self)
 
             if not options['skip_geonames']:
                 self.stdout.write(
                     self.style.MIGRATE_LABEL("GeoNames Importation"))
 
                 file = options['file2'] or file[0]
-                geonames_importation(self, file)
+                geonames_importation(self, file, options['processes'], options['batch-size'])
 
                 if not options['skip-features']:
                     file = options['file3']
                     features_importation(file)
 
-            if not options['skip-clean-osm']:
+            """
+            With --only-named the entities without name are not imported, there is nothing to clean
+            """
+            if not options['skip-clean-osm'] and named_filter is None:
                 self.stdout.write(
                     self.style.MIGRATE_LABEL("Cleaning OSM entities"))
 
@@ -127,43 +219,191 @@ class Command(BaseCommand):
             raise CommandError(detail)
 
 
-def geonames_importation(self, file):
+def get_scheduled_work(file, resume=False):
+    """
+    The work pending for the importation. If we resume the importation, and there is not a work
+    pending, we take again the work of the checkpoint.
+    :param file:
+    :param resume:
+    :return:
+    """
+    try:
+        return ScheduledWork.objects.get(name=SCHEDULED_WORK_IMPORTATION_PROCESS, status=PENDING)
+    except ScheduledWork.DoesNotExist:
+        checkpoint = ImportationCheckpoint.objects.filter(file_name=file).first() if resume else None
+        if checkpoint is None or checkpoint.scheduled_work is None:
+            raise
+
+        return checkpoint.scheduled_work
+
+
+def geonames_importation(self, file, processes=1, batch_size=DEFAULT_BATCH_SIZE):
     """
     This method execute the importation of geonames points.
-    Read all the file and save every entity in the database
+    The file is split in chunks aligned on the lines, every chunk is read and saved
+    by batches in a pool of processes. The lines rejected are written in the file
+    <file>.rejected
     
     :param file: 
+    :param processes:
+    :param batch_size:
     :return: 
     """
 
     print("%s INFO: Importation points geographiques." % datetime.now())
+    begin = datetime.now()
+    tasks = [(file, chunk_begin, chunk_end, batch_size) for chunk_begin, chunk_end in geonames_chunks(file)]
+
+    if processes > 1:
+        """
+        Every process opens its own connection to the DB
+        """
+        connections.close_all()
+        pool = Pool(processes)
+        results = pool.imap_unordered(_geonames_chunk_importation, tasks)
+    else:
+        pool = None
+        results = map(_geonames_chunk_importation, tasks)
+
     count = 0
-    with open(file, encoding='utf-8') as file_object:
-        for line in file_object:
-            fields = line.split('\t')
-            try:
-                elevation = int(fields[15])
-            except ValueError:
-                elevation = 0
-
-            try:
-                geoname = Geonames(id=fields[0], name=fields[1], ascii_name=fields[2],
-                                   alternative_name=fields[3].encode('utf-8'), latitude=fields[4],
-                                   longitude=fields[5], fclass=fields[6], fcode=fields[7],
-                                   cc2=fields[9], admin1=fields[10], admin2=fields[11],
-                                   admin3=fields[12], admin4=fields[13], population=fields[14],
-                                   elevation=elevation, gtopo30=fields[16], timezone=fields[17],
-                                   moddate=fields[18])
-                geoname.save()
-                count += 1
-            except Exception as error:
-                print(line)
-                self.stdout.write(
-                    self.style.ERROR("One error in the importation" + str(error)))
+    rejected = 0
+    try:
+        with open(file + '.rejected', 'w', encoding='utf-8') as rejected_file:
+            for chunk_count, chunk_rejected in results:
+                count += chunk_count
+                rejected += len(chunk_rejected)
+                rejected_file.writelines(chunk_rejected)
+
+                elapsed = (datetime.now() - begin).total_seconds()
+                print("%s INFO: %d entities imported (%.0f rows/s)." % (datetime.now(), count,
+                                                                        count / elapsed if elapsed else 0))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
 
     self.stdout.write(
         self.style.MIGRATE_HEADING("%s INFO: %d entities imported." % (datetime.now(), count)))
-    file_object.close()
+
+    if rejected > 0:
+        self.stdout.write(
+            self.style.ERROR("%s INFO: %d lines rejected, see %s.rejected" % (datetime.now(), rejected, file)))
+
+
+def geonames_chunks(file, chunk_size=GEONAMES_CHUNK_SIZE):
+    """
+    Split the file in byte ranges, every range ends at the end of a line
+    :param file:
+    :param chunk_size:
+    :return: a generator of (begin, end)
+    """
+    size = os.path.getsize(file)
+    with open(file, 'rb') as file_object:
+        begin = 0
+        while begin < size:
+            end = begin + chunk_size
+            if end < size:
+                file_object.seek(end)
+                file_object.readline()
+                end = file_object.tell()
+            else:
+                end = size
+
+            yield begin, end
+            begin = end
+
+
+def _geonames_chunk_importation(task):
+    """
+    Read and save all the lines of a chunk of the file
+    :param task: (file, begin, end, batch_size)
+    :return: the quantity of entities imported and the list of lines rejected
+    """
+    file, begin, end, batch_size = task
+
+    with open(file, 'rb') as file_object:
+        file_object.seek(begin)
+        text = file_object.read(end - begin).decode('utf-8')
+
+    """
+    The chunks end at the character \\n, the other line separators of splitlines (\\x0b, \\x85, \\u2028...)
+    can be in the alternative names
+    """
+    lines = [line + '\n' for line in text.split('\n') if line]
+
+    count = 0
+    rejected = []
+    batch = []
+    for line in lines:
+        try:
+            batch.append(geonames_entity(line))
+        except (ValueError, IndexError, InvalidOperation):
+            rejected.append(line)
+
+        if len(batch) >= batch_size:
+            count += _geonames_batch_importation(batch, rejected)
+            batch = []
+
+    count += _geonames_batch_importation(batch, rejected)
+
+    return count, rejected
+
+
+def _geonames_batch_importation(batch, rejected):
+    """
+    Save the batch and the variants of the names with a multi-row insert. If the insert fails, the
+    entities are saved one by one for find the rows with errors.
+    :param batch:
+    :param rejected: the list of lines rejected
+    :return: the quantity of entities saved
+    """
+    if not batch:
+        return 0
+
+    try:
+        with transaction.atomic():
+            Geonames.objects.bulk_create(batch)
+            bulk_insert_ignore(NameVariant, [variant for geoname in batch for variant in geonames_variants(geoname)])
+        return len(batch)
+    except Exception:
+        pass
+
+    count = 0
+    for geoname in batch:
+        try:
+            with transaction.atomic():
+                geoname.save(force_insert=True)
+                bulk_insert_ignore(NameVariant, geonames_variants(geoname))
+            count += 1
+        except Exception:
+            rejected.append(geoname.line)
+
+    return count
+
+
+def geonames_entity(line):
+    """
+    Parse a line of the dump of GeoNames
+    :param line:
+    :return: a Geonames entity not saved
+    """
+    fields = line.rstrip('\r\n').split('\t')
+
+    try:
+        elevation = int(fields[15])
+    except ValueError:
+        elevation = 0
+
+    geoname = Geonames(id=int(fields[0]), name=fields[1], ascii_name=fields[2],
+                       alternative_name=fields[3], latitude=Decimal(fields[4]),
+                       longitude=Decimal(fields[5]), fclass=fields[6], fcode=fields[7],
+                       cc2=fields[9], admin1=fields[10], admin2=fields[11],
+                       admin3=fields[12], admin4=fields[13], population=int(fields[14]),
+                       elevation=elevation, gtopo30=int(fields[16]), timezone=fields[17],
+                       moddate=datetime.strptime(fields[18], '%Y-%m-%d').date())
+    geoname.line = line
+
+    return geoname
 
 
 def features_importation(file):
@@ -188,178 +428,277 @@ def features_importation(file):
     file_object.close()
 
 
-def osm_importation(self, file, scheduled_work):
+def osm_importation(self, file, scheduled_work, batch_size=DEFAULT_BATCH_SIZE, processes=1, resume=False,
+                    named_filter=None):
     """
-    Read of file line by line for find every tag 
+    Read of file element by element, the file can be a XML (.osm) or a PBF (.osm.pbf) dump.
+    The entities are kept in a buffer and written by batches of batch_size rows.
+
+    With every batch we save a checkpoint with the last element written and the offset of the file
+    where the reading can restart. With resume, the importation restarts from the checkpoint and
+    the elements already written are skipped, the dumps are sorted by type and id.
     :param self: 
     :param file: 
     :param scheduled_work: 
+    :param batch_size:
+    :param processes: the quantity of processes for decode the PBF blocks
+    :param resume: restart from the checkpoint of the file
+    :param named_filter: NamedEntitiesFilter, the elements not kept by the filter are not imported
     :return: 
     """
-    path = []
-    flag_nodes = False
-    flag_ways = False
+
+    def report(bulk_writer):
+        print("%s INFO: %d rows written (%.0f rows/s)." % (datetime.now(), bulk_writer.rows,
+                                                           bulk_writer.rows_per_second()))
+
+    def warning(message):
+        self.stdout.write(self.style.WARNING(message))
+
+    last_element = {}
+
+    def save_checkpoint(bulk_writer):
+        if last_element:
+            ImportationCheckpoint.objects.update_or_create(file_name=file,
+                                                           defaults=dict(last_element, scheduled_work=scheduled_work,
+                                                                         date=timezone.now()))
+
+    """
+    The variants already saved by a previous run are not written again
+    """
+    writer = BulkWriter(batch_size=batch_size, callback=report, checkpoint=save_checkpoint,
+                        ignore_models=(NameVariant,), log=warning)
+    cursor = connection.cursor()
+
+    checkpoint = None
+    if resume:
+        checkpoint = ImportationCheckpoint.objects.filter(file_name=file).first()
+        if checkpoint is None:
+            raise Exception("There is no checkpoint for the file %s" % file)
+
+        self.stdout.write(
+            self.style.MIGRATE_HEADING("%s INFO: Resume after the %s %d at the offset %d." %
+                                       (datetime.now(), checkpoint.element_type.lower(), checkpoint.element_id,
+                                        checkpoint.byte_offset)))
+    else:
+        ImportationCheckpoint.objects.filter(file_name=file).delete()
+        cursor.execute("TRUNCATE TABLE {0}".format(MemberForImport._meta.db_table))
+
+    offset = checkpoint.byte_offset if checkpoint else 0
+    skip_until = (ELEMENT_ORDER[checkpoint.element_type], checkpoint.element_id) if checkpoint else None
+
+    # The sections already written before the checkpoint
+    flag_nodes = checkpoint is not None and checkpoint.element_type in (WAY, RELATION)
+    flag_ways = checkpoint is not None and checkpoint.element_type == RELATION
     count = 0
-    for event, elem in ET.iterparse(file, events=("start", "end")):
-        try:
-            if event == 'start':
-                path.append(elem)
+    for offset, element in read_osm_file(file, processes, offset):
+        element_type = ELEMENT_TYPES[type(element)]
 
-            elif event == 'end' and elem.tag == 'node':
-                nodes_importation(elem, path)
-                path.clear()
-                count += 1
+        if skip_until is not None:
+            if (ELEMENT_ORDER[element_type], element.id) <= skip_until:
+                continue
+            skip_until = None
+
+        if named_filter is not None and not named_filter.keep(element):
+            continue
+
+        """
+        The changes of section write all the previous section and apply its memberships, outside of
+        the errors of an element: if they fail the importation stops at the checkpoint
+        """
+        if element_type == WAY and not flag_nodes:
+            """
+            The ways update the nodes, so all the nodes must be written before
+            """
+            flag_nodes = True
+            writer.flush()
 
-            elif event == 'end' and elem.tag == 'way':
-                if not flag_nodes:
-                    self.stdout.write(
-                        self.style.MIGRATE_HEADING("%s INFO: %d nodes imported." % (datetime.now(), count)))
-                    scheduled_work.affected_rows += count
-                    scheduled_work.save()
-                    count = 0
-                    flag_nodes = True
+            self.stdout.write(
+                self.style.MIGRATE_HEADING("%s INFO: %d nodes imported." % (datetime.now(), count)))
+            scheduled_work.affected_rows += count
+            scheduled_work.save()
+            count = 0
+
+        elif element_type == RELATION and not flag_ways:
+            flag_ways = True
+            writer.flush()
+            memberships_importation(self, WAY)
+
+            self.stdout.write(
+                self.style.MIGRATE_HEADING("%s INFO: %d ways imported." % (datetime.now(), count)))
+            scheduled_work.affected_rows += count
+            scheduled_work.save()
+            count = 0
+
+        try:
+            if element_type == NODE:
+                last_element.update(element_type=NODE, element_id=element.id, byte_offset=offset)
+                nodes_importation(writer, element)
+                count += 1
 
-                ways_importation(elem, path)
+            elif element_type == WAY:
+                last_element.update(element_type=WAY, element_id=element.id, byte_offset=offset)
+                ways_importation(writer, element)
                 count += 1
 
-            elif event == 'end' and elem.tag == 'relation':
-                if not flag_ways:
-                    self.stdout.write(
-                        self.style.MIGRATE_HEADING("%s INFO: %d ways imported." % (datetime.now(), count)))
-                    scheduled_work.affected_rows += count
-                    scheduled_work.save()
-                    count = 0
-                    flag_ways = True
-
-                relation_importation(elem, path)
-                path.clear()
+            elif element_type == RELATION:
+                last_element.update(element_type=RELATION, element_id=element.id, byte_offset=offset)
+                relation_importation(writer, element)
                 count += 1
+        except FlushError:
+            """
+            The elements of the batch are lost, the importation stops at the checkpoint of the
+            previous batch and it can be resumed from there
+            """
+            raise
         except Exception as detail:
             self.stdout.write(
                 self.style.ERROR(("%s ERROR: " % datetime.now()) + str(detail)))
             scheduled_work.error_rows += 1
             scheduled_work.save()
 
+    """
+    The last batch and the memberships must be written before the end of the importation, else the
+    work ends in ERROR and the checkpoint is kept for --resume
+    """
+    writer.flush()
+    if not flag_ways:
+        memberships_importation(self, WAY)
+    memberships_importation(self, RELATION)
+    cursor.execute("TRUNCATE TABLE {0}".format(MemberForImport._meta.db_table))
+    ImportationCheckpoint.objects.filter(file_name=file).delete()
+
+    """
+    The rows not written by the writer are counted with the errors
+    """
     scheduled_work.affected_rows += count
+    scheduled_work.error_rows += writer.error_rows
     scheduled_work.save()
 
     self.stdout.write(
         self.style.MIGRATE_HEADING("%s INFO: %d relations imported." % (datetime.now(), count)))
+    self.stdout.write(
+        self.style.MIGRATE_HEADING("%s INFO: %d rows written, %d rows in error (%.0f rows/s)." %
+                                   (datetime.now(), writer.rows, writer.error_rows, writer.rows_per_second())))
 
 
-def nodes_importation(xml_point, xml_tags):
+def nodes_importation(writer, node):
     """
-    Importation des noeuds OSM du fichier XML vers la BD relationnel avec ses tags
-    :param xml_point: 
-    :param xml_tags: 
+    Importation des noeuds OSM vers la BD relationnel avec ses tags
+    :param writer:
+    :param node: OsmNode
     :return: 
     """
 
-    point = Node(id=xml_point.get('id'), latitude=xml_point.get('lat'),
-                 longitude=xml_point.get('lon'))
-    point.save()
+    instances = [Node(id=node.id, latitude=node.latitude, longitude=node.longitude,
+                      cell=get_cell(node.latitude, node.longitude))]
 
-    count_tags = 0
-    for xml_tag in xml_tags:
-        if xml_tag.tag == 'tag':
-            """
-            On verifie que le tag soit ecrit en anglais et sinon, c'est pas necessaire
-            de le garder dans la BD
-            """
-            if not another_language(xml_tag.get('k')):
-                tag = Tag(reference=xml_point.get('id'), type=NODE,
-                          key=xml_tag.get('k'), value=xml_tag.get('v'))
-                tag.save()
-                count_tags += 1
+    for key, value in node.tags:
+        """
+        On verifie que le tag soit ecrit en anglais et sinon, c'est pas necessaire
+        de le garder dans la BD, le nom est garde comme variante
+        """
+        if not another_language(key):
+            instances.append(Tag(reference=node.id, type=NODE, key=key, value=value))
 
-    if count_tags > 0:
-        print("%s INFO: %d tags imported." % (datetime.now(), count_tags))
+    instances.extend(name_variants_importation(node.id, NODE, node.tags))
 
-    xml_point.clear()
-    xml_tags.clear()
+    writer.add(*instances)
 
 
-def ways_importation(xml_way, xml_way_childs):
+def ways_importation(writer, way):
     """
     Importation des WAYs de OSM, avec ses tags et ses relations avec les noeuds
-    :param xml_way: 
-    :param xml_way_child: 
+    :param writer:
+    :param way: OsmWay
     :return: 
     """
 
-    way = Way(id=xml_way.get('id'))
-    way.save()
+    instances = [Way(id=way.id)]
 
-    count_tag = 0
-    count_nodes = 0
-    for xml_child in xml_way_childs:
-        if xml_child.tag == 'nd':
-            Node.objects.filter(pk=xml_child.get('ref')) \
-                .update(way_reference=xml_way.get('id'))
-            count_nodes += 1
-        elif xml_child.tag == 'tag' and not another_language(xml_child.get('k')):
-            tag = Tag(reference=xml_way.get('id'), type=WAY,
-                      key=xml_child.get('k'), value=xml_child.get('v'))
-            tag.save()
-            count_tag += 1
+    for ref in way.refs:
+        instances.append(MemberForImport(type=NODE, reference=ref, parent_type=WAY, parent_reference=way.id))
 
-    if count_tag > 0:
-        print("%s INFO: %d tags imported." % (datetime.now(),
-                                              len(xml_way.findall('tag'))))
+    for key, value in way.tags:
+        if not another_language(key):
+            instances.append(Tag(reference=way.id, type=WAY, key=key, value=value))
 
-    if count_nodes > 0:
-        print("%s INFO: %d noeuds imported." % (datetime.now(),
-                                                len(xml_way.findall('nd'))))
+    instances.extend(name_variants_importation(way.id, WAY, way.tags))
 
-    xml_way.clear()
-    xml_way_childs.clear()
+    writer.add(*instances)
 
 
-def relation_importation(xml_relation, xml_childs):
+def relation_importation(writer, relation):
     """
     Importation des relations OSM vers la BD relationnel, avec ses tags et membres.
-    :param xml_relation: 
-    :param xml_child: 
+    :param writer:
+    :param relation: OsmRelation
     :return: 
     """
 
-    relation = Relation(id=xml_relation.get('id'), role=xml_relation.get('role') or '')
-    relation.save()
-
-    count_tag = 0
-    count_member = 0
-    for xml_child in xml_childs:
-        if xml_child.tag == 'tag' and not another_language(xml_child.get('k')):
-            tag = Tag(reference=xml_relation.get('id'), type=RELATION,
-                      key=xml_child.get('k'), value=xml_child.get('v'))
-            tag.save()
-
-            count_tag += 1
-        elif xml_child.tag == 'member':
-            if xml_child.get('type') == 'node':
-                Node.objects.filter(pk=xml_child.get('ref')) \
-                    .update(relation_reference=xml_relation.get('id'),
-                            role=xml_child.get('role'))
-            elif xml_child.get('type') == 'way':
-                Way.objects.filter(pk=xml_child.get('ref')) \
-                    .update(relation_reference=xml_relation.get('id'),
-                            role=xml_child.get('role'))
-            elif xml_child.get('type') == 'relation':
-                Relation.objects.filter(pk=xml_child.get('ref')) \
-                    .update(relation_reference=xml_relation.get('id'),
-                            role=xml_child.get('role'))
-            count_member += 1
-
-    print("%s INFO: %d tags imported." % (datetime.now(), count_tag))
-    print("%s INFO: %d members imported." % (datetime.now(), count_member))
-
-    xml_relation.clear()
-    xml_childs.clear()
+    instances = [Relation(id=relation.id, role='')]
+
+    for key, value in relation.tags:
+        if not another_language(key):
+            instances.append(Tag(reference=relation.id, type=RELATION, key=key, value=value))
+
+    instances.extend(name_variants_importation(relation.id, RELATION, relation.tags))
+
+    for member in relation.members:
+        if member.type in ('node', 'way', 'relation'):
+            instances.append(MemberForImport(type=member.type.upper(), reference=member.ref,
+                                             parent_type=RELATION, parent_reference=relation.id,
+                                             role=member.role))
+
+    writer.add(*instances)
+
+
+def name_variants_importation(reference, shape, tags):
+    """
+    The names in the other languages are not kept as tags, they are kept as variants of the name
+    :param reference:
+    :param shape: NODE, WAY or RELATION
+    :param tags: the (key, value) of the element
+    :return: the NameVariant not saved
+    """
+    names = [value for key, value in tags if another_language(key)]
+    if not names:
+        return []
+
+    main_name = next((value for key, value in tags if key == 'name'), '')
+    return osm_variants(reference, shape, names, main_name)
+
+
+def memberships_importation(self, parent_type):
+    """
+    Apply the memberships staged during the importation of a section (the nodes of the ways or
+    the members of the relations) with an UPDATE ... JOIN by chunk of the staging table. The chunks
+    are applied in the order of the ids, so the last membership of a member is kept like before.
+    :param self:
+    :param parent_type: WAY or RELATION
+    :return: the quantity of rows updated
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT MIN(id), MAX(id) FROM services_memberforimport WHERE parent_type = %s", [parent_type])
+    min_id, max_id = cursor.fetchone()
+
+    count = 0
+    if min_id is not None:
+        for member_type, query in MEMBERSHIP_UPDATES[parent_type]:
+            for begin in range(min_id, max_id + 1, MEMBERSHIP_CHUNK_SIZE):
+                cursor.execute(query.format(LATEST_MEMBERSHIPS),
+                               [parent_type, member_type, begin, begin + MEMBERSHIP_CHUNK_SIZE - 1])
+                count += cursor.rowcount
+
+    self.stdout.write(
+        self.style.MIGRATE_HEADING("%s INFO: %d memberships of %s applied." %
+                                   (datetime.now(), count, parent_type.lower())))
+    return count
 
 
 def clean_entities_without_name(self):
     """
-    This method has another approach in the file 'clean-osm-entities.py' But this works anyway.
+    This method deletes all the entities without name with the set-based engine of
+    services.algorithms.algorithm_cleaning
     :param self: 
     :return: 
     """
@@ -367,77 +706,36 @@ def clean_entities_without_name(self):
     self.stdout.write(
         self.style.MIGRATE_HEADING("%s INFO: Cleaning OSM Entities" % datetime.now()))
 
-    count = 0
-    rows = 1
-    cursor = connection.cursor()
+    deleted = clean_osm_entities()
 
-    while not rows == 0:
-        cursor.execute(
-            "SELECT n.id  FROM services_node n WHERE n.relation_reference_id IS NULL AND " +
-            "n.way_reference_id IS NULL AND NOT EXISTS (SELECT t.id FROM services_tag t WHERE " +
-            "t.reference = n.id AND t.key IN ('name','name:en')) LIMIT 1000")
-
-        fathers_nodes = cursor.fetchall()
-        rows = 0
-        for node_id in fathers_nodes:
-            node_id = next(iter(node_id or []), None)
-            rows += 1
-            Tag.objects.filter(reference=node_id, type=NODE).delete()
-            Node.objects.filter(pk=node_id).delete()
-            count += 1
-
-        if rows < 1000:
-            rows = 0
-
-        print("%s INFO: %d nodes deleted. Affected %d" % (datetime.now(), count, rows))
+    self.stdout.write(
+        self.style.MIGRATE_HEADING("%s INFO: %s" % (datetime.now(), ", ".join(
+            "%d %s deleted" % (count, name) for name, count in deleted.items()))))
+    self.stdout.write("Process ended ... " + self.style.SUCCESS("OK"))
 
-    count = 0
-    rows = 1
-    while not rows == 0:
-        cursor.execute(
-            "SELECT w.id FROM services_way w WHERE w.relation_reference_id IS NULL AND NOT "
-            "EXISTS (SELECT t.id FROM services_tag t WHERE t.reference = w.id AND t.key "
-            "IN ('name', 'name:en')) LIMIT 1000")
-
-        fathers_ways = cursor.fetchall()
-        rows = 0
-        for way_id in fathers_ways:
-            way_id = next(iter(way_id or []), None)
-            rows += 1
-            Tag.objects.filter(reference=way_id, type=WAY).delete()
-            Node.objects.filter(way_reference=way_id).delete()
-            Way.objects.filter(pk=way_id).delete()
 
-            count += 1
+def roots_importation(self):
+    """
+    This method calculates the entity of higher level of every node and way, and refreshes the
+    named entities and the index of their names, for the blocking
+    :param self:
+    :return:
+    """
 
-        if rows < 1000:
-            rows = 0
+    self.stdout.write(
+        self.style.MIGRATE_HEADING("%s INFO: Roots of OSM Entities" % datetime.now()))
 
-    print("%s INFO: %d ways deleted." % (datetime.now(), count))
+    cycles = calculate_roots()
 
-    count = 0
-    rows = 1
-    while not rows == 0:
-        cursor.execute(
-            "SELECT r.id FROM services_relation r WHERE r.relation_reference_id IS NULL AND "
-            "NOT EXISTS (SELECT t.id FROM services_tag t WHERE t.reference = r.id AND t.key "
-            "IN ('name', 'name:en')) LIMIT 1000")
-
-        fathers_relations = cursor.fetchall()
-        rows = 0
-        for relation_id in fathers_relations:
-            relation_id = next(iter(relation_id or []), None)
-            rows += 1
-            Tag.objects.filter(reference=relation_id, type=RELATION).delete()
-            Node.objects.filter(relation_reference=relation_id).delete()
-            Way.objects.filter(relation_reference=relation_id).delete()
-            Relation.objects.filter(pk=relation_id).delete()
-
-        if rows < 1000:
-            rows = 0
-
-    print("%s INFO: %d relation deleted." % (datetime.now(), count))
+    if cycles:
+        self.stdout.write(
+            self.style.WARNING("%s WARNING: %d relations in a cycle." % (datetime.now(), len(cycles))))
 
+    """
+    The named entities depend on the roots, and the index of the names on the named entities
+    """
+    refresh_named_entities()
+    refresh_name_index()
     self.stdout.write("Process ended ... " + self.style.SUCCESS("OK"))
 
 
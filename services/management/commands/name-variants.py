@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+from django.core.management.base import BaseCommand, CommandError
+from services.algorithms.algorithm_name_variants import refresh_geonames_variants, VARIANTS_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'This process builds again the variants of the names of the GeoNames entities, for the entities ' \
+           'imported before the table of the variants.'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '--chunk-size',
+            default=VARIANTS_CHUNK_SIZE,
+            type=int,
+            metavar="int",
+            dest='chunk-size',
+            help="The quantity of entities read and written together")
+
+    def handle(self, *args, **options):
+        try:
+            count = refresh_geonames_variants(options['chunk-size'])
+
+            self.stdout.write(self.style.SUCCESS("%d name variants written." % count))
+
+        except Exception as error:
+            raise CommandError(error)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+from django.core.management.base import BaseCommand, CommandError
+from services.algorithms.algorithm_named_entities import refresh_named_entities, NAMED_CHUNK_SIZE
+from services.algorithms.algorithm_name_index import refresh_name_index
+
+
+class Command(BaseCommand):
+    help = 'This process refreshes the table of the root entities OSM with a name used by the blocking, ' \
+           'and the index of their names.'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            dest='full',
+            default=False,
+            help="Build again all the table instead of an incremental refresh")
+
+        parser.add_argument(
+            '--chunk-size',
+            default=NAMED_CHUNK_SIZE,
+            type=int,
+            metavar="int",
+            dest='chunk-size',
+            help="The quantity of entities read and written together")
+
+    def handle(self, *args, **options):
+        try:
+            deleted, updated, added = refresh_named_entities(options['full'], options['chunk-size'])
+
+            self.stdout.write(self.style.SUCCESS("%d named entities deleted, %d named entities updated, "
+                                                 "%d named entities added." % (deleted, updated, added)))
+
+            indexed = refresh_name_index(options['full'], options['chunk-size'])
+
+            self.stdout.write(self.style.SUCCESS("%d names indexed." % indexed))
+
+        except Exception as error:
+            raise CommandError(error)
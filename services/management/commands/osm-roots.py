@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+from django.core.management.base import BaseCommand, CommandError
+from services.algorithms.algorithm_roots import calculate_roots, ROOTS_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'This process calculates the entity of higher level (root) of all the nodes and ways OSM.'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '--chunk-size',
+            default=ROOTS_CHUNK_SIZE,
+            type=int,
+            metavar="int",
+            dest='chunk-size',
+            help="The range of ids of nodes and ways updated by query")
+
+    def handle(self, *args, **options):
+        try:
+            cycles = calculate_roots(options['chunk-size'])
+
+            if cycles:
+                self.stdout.write(self.style.WARNING("%d relations in a cycle, they are their own root." %
+                                                     len(cycles)))
+            self.stdout.write(self.style.SUCCESS("Roots calculated."))
+
+        except Exception as error:
+            raise CommandError(error)
@@ -1,7 +1,7 @@
 # !/usr/bin/env python3
 from django.core.management.base import BaseCommand, CommandError
 
-from services.algorithms.algorithm_learning import LearningAlgorithm
+from services.algorithms.algorithm_learning import LearningAlgorithm, RECALCULATION_CHUNK_SIZE, PROGRESS_INTERVAL
 from services.models import Geonames, ScheduledWork, PENDING, INPROGRESS, FINALIZED, ERROR, \
     SCHEDULED_WORK_RECALCULATE_PERTINENCE_SCORE, ParametersScorePertinence
 from datetime import datetime
@@ -14,6 +14,24 @@ class Command(BaseCommand):
     help = 'This methode recalculate the pertinence score according to the last value active ' \
            'in the table of parameters score pertinenece'
 
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '--chunk-size',
+            default=RECALCULATION_CHUNK_SIZE,
+            type=int,
+            metavar="int",
+            dest='chunk-size',
+            help="The quantity of ids of correspondences updated together")
+
+        parser.add_argument(
+            '--progress-interval',
+            default=PROGRESS_INTERVAL,
+            type=int,
+            metavar="int",
+            dest='progress-interval',
+            help="The quantity of chunks between two saves of the progress in the scheduled work")
+
     def handle(self, *args, **options):
 
         self.stdout.write(
@@ -31,15 +49,20 @@ class Command(BaseCommand):
             scheduled_work.save()
 
             weights_id = int(ParametersScorePertinence.objects.get(name="weight_matching_global", active=1, all_types=1).id)
-            affected_rows = LearningAlgorithm.recalculate_pertinence_score(weights_id)
+            affected_rows = LearningAlgorithm.recalculate_pertinence_score(weights_id, scheduled_work,
+                                                                           options['chunk-size'],
+                                                                           options['progress-interval'])
 
-            if scheduled_work.error_rows == scheduled_work.affected_rows:
+            """
+            The total of rows is saved by the recalculation before the first chunk
+            """
+            scheduled_work.affected_rows = affected_rows
+
+            if scheduled_work.affected_rows > 0 and scheduled_work.error_rows == scheduled_work.affected_rows:
                 scheduled_work.status = ERROR
             else:
                 scheduled_work.status = FINALIZED
 
-            scheduled_work.affected_rows = affected_rows
-            scheduled_work.total_rows = affected_rows
             scheduled_work.final_date = timezone.now()
             scheduled_work.save()
 
@@ -1,31 +1,37 @@
 #!/usr/bin/env python3
 from django.core.management.base import BaseCommand, CommandError
-from services.models import Geonames, CorrespondenceEntity, FeatureCode, NODE
-from services.classes.classes import EntityGeoNames
-from services.algorithms.algorithm_blocking import blocking_function
-from services.algorithms.algorithm_align import align_algorithme
-from services.algorithms.pertinence_score import get_pertinence_score
-from services.classes.classes import PositionGPS
-from util.coordinates_matching import matching_coordinates
+from util.coordinates_matching import recalculate_coordinates_matching, RECALCULATION_CHUNK_SIZE
 
 __author__ = 'Amaia Nazabal'
 
 
 class Command(BaseCommand):
-    help = 'This process made the align between entities from GeoNames to OSM.'
+    help = 'This process calculates again the similarity of the coordinates of all the correspondences. ' \
+           'The pertinence score is not calculated again (./manage.py recalculate-pertinence-score).'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '--search-radius',
+            default=False,
+            type=float,
+            metavar="float",
+            dest='search-radius',
+            help="The search radius in kilometers, the parameter search_radius_for_blocking by default")
+
+        parser.add_argument(
+            '--chunk-size',
+            default=RECALCULATION_CHUNK_SIZE,
+            type=int,
+            metavar="int",
+            dest='chunk-size',
+            help="The quantity of ids of correspondences updated together")
 
     def handle(self, *args, **options):
         try:
-            correspondences = CorrespondenceEntity.objects.only('id', 'reference_gn', 'osm_latitude', 'osm_longitude')\
-                .all()
-            for correspondence in correspondences:
-                gn_entity = Geonames.objects.only('latitude', 'longitude').get(pk=correspondence.reference_gn)
-
-                position_gn = PositionGPS(gn_entity.latitude, gn_entity.longitude)
-                position_osm = PositionGPS(correspondence.osm_latitude, correspondence.osm_longitude)
-                coordinates_matching = matching_coordinates(position_gn, position_osm, 1)
-                CorrespondenceEntity.objects.filter(pk=correspondence.id).update(
-                    similarity_coordinates=coordinates_matching)
+            count = recalculate_coordinates_matching(options['search-radius'], options['chunk-size'])
+
+            self.stdout.write(self.style.SUCCESS("%d correspondences updated." % count))
 
         except Exception as error:
             raise CommandError(error)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from util.spatial_grid import CELL_SQL
+
+UPDATE_CELLS = "UPDATE services_node SET cell = {0} WHERE id BETWEEN %s AND %s{1}"
+
+
+class Command(BaseCommand):
+    help = 'This process calculates the cell of the spatial grid of the nodes imported without cell.'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '--chunk-size',
+            default=100000,
+            type=int,
+            metavar="int",
+            dest='chunk-size',
+            help="The quantity of ids of nodes updated by query")
+
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            dest='all',
+            default=False,
+            help="Calculate again the cells of all the nodes")
+
+    def handle(self, *args, **options):
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT MIN(id), MAX(id) FROM services_node")
+            min_id, max_id = cursor.fetchone()
+
+            if min_id is None:
+                return
+
+            query = UPDATE_CELLS.format(CELL_SQL, "" if options['all'] else " AND cell IS NULL")
+            chunk_size = options['chunk-size']
+
+            count = 0
+            for chunk_begin in range(min_id, max_id + 1, chunk_size):
+                cursor.execute(query, [chunk_begin, chunk_begin + chunk_size - 1])
+                count += cursor.rowcount
+
+            print("%s INFO: %d cells of nodes calculated." % (datetime.now(), count))
+
+        except Exception as error:
+            raise CommandError(error)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import json
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from services.models import FeatureCode, FeatureSynonyms
+from services.classes.synonyms_store import SynonymsStore, request_synonyms, NO_SYNONYMS_NAMES
+
+
+class Command(BaseCommand):
+    help = 'This process fills the local store of the synonyms of the feature codes, from a file or from ' \
+           'the synonyms API, for the matching without network.'
+
+    def add_arguments(self, parser):
+
+        parser.add_argument(
+            '--file',
+            default=False,
+            metavar="FILE",
+            dest='file',
+            help="A JSON file with the list of synonyms of every name of feature code: {\"name\": [\"synonym\"]}")
+
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            dest='refresh',
+            default=False,
+            help="Search again in the API the names already in the store")
+
+    def handle(self, *args, **options):
+        try:
+            store = SynonymsStore(cache_only=False)
+
+            if options['file']:
+                with open(options['file'], encoding='utf-8') as file_object:
+                    synonyms = json.load(file_object)
+
+                for feature_name, feature_synonyms in synonyms.items():
+                    store.save(feature_name, feature_synonyms)
+
+                print("%s INFO: Synonyms of %d names imported." % (datetime.now(), len(synonyms)))
+                return
+
+            names = set(FeatureCode.objects.exclude(name='').values_list('name', flat=True))
+            if not options['refresh']:
+                names.difference_update(FeatureSynonyms.objects.values_list('feature_name', flat=True))
+            names.difference_update(NO_SYNONYMS_NAMES)
+
+            count = 0
+            errors = 0
+            for feature_name in sorted(names):
+                feature_synonyms = request_synonyms(feature_name, store.timeout)
+                if feature_synonyms is None:
+                    errors += 1
+                    continue
+
+                store.save(feature_name, feature_synonyms)
+                count += 1
+
+            print("%s INFO: Synonyms of %d names saved, %d names in error." % (datetime.now(), count, errors))
+
+        except Exception as error:
+            raise CommandError(error)
@@ -61,12 +61,41 @@ class Tag(models.Model):
     key = models.CharField(max_length=100)
     value = models.CharField(max_length=300)
 
+    class Meta:
+        index_together = ['reference', 'type']
+
 
 class TagForClean(models.Model):
     id = models.IntegerField(primary_key=True)
     reference = models.BigIntegerField(db_index=True)
 
 
+class EntityForClean(models.Model):
+    """
+    Staging table of the entities without name, with all their descendants, which are deleted
+    by the cleaning of OSM entities.
+    """
+    id = models.AutoField(primary_key=True)
+    reference = models.BigIntegerField()
+    type = models.CharField(choices=STRUCTURE_TYPE, max_length=10)
+
+    class Meta:
+        unique_together = ('type', 'reference')
+
+
+class MemberForImport(models.Model):
+    """
+    Staging table of the memberships read during the OSM importation, they are applied
+    on the nodes, ways and relations when all the section has been read.
+    """
+    id = models.AutoField(primary_key=True)
+    type = models.CharField(choices=STRUCTURE_TYPE, max_length=10)
+    reference = models.BigIntegerField()
+    parent_type = models.CharField(choices=STRUCTURE_TYPE, max_length=10)
+    parent_reference = models.BigIntegerField()
+    role = models.CharField(max_length=50, null=True)
+
+
 class Node(models.Model):
     id = models.BigIntegerField(unique=True, primary_key=True)
 
@@ -82,9 +111,14 @@ class Node(models.Model):
     role = models.CharField(max_length=50, null=True)
     # Si le tag name de l'entite a été déjà cherché ou pas.
     checked_name = models.BooleanField(default=False)
+    # La cellule de la grille spatiale (util/spatial_grid.py) du noeud
+    cell = models.IntegerField(null=True, blank=True, db_index=True)
+    # L'entite de plus haut niveau (services/algorithms/algorithm_roots.py) du noeud
+    root_reference = models.BigIntegerField(null=True, blank=True)
+    root_shape = models.CharField(max_length=10, choices=STRUCTURE_TYPE, null=True, blank=True)
 
     class Meta:
-        index_together = ['latitude', 'longitude']
+        index_together = [['latitude', 'longitude'], ['root_reference', 'root_shape']]
 
 
 class Way(models.Model):
@@ -96,6 +130,8 @@ class Way(models.Model):
 
     role = models.CharField(max_length=50, null=True)
     checked_name = models.BooleanField(default=False)
+    root_reference = models.BigIntegerField(null=True, blank=True)
+    root_shape = models.CharField(max_length=10, choices=STRUCTURE_TYPE, null=True, blank=True)
 
 
 class Relation(models.Model):
@@ -104,6 +140,61 @@ class Relation(models.Model):
     relation_reference = models.ForeignKey('Relation', on_delete=models.CASCADE,
                                            null=True, blank=True)
     checked_name = models.BooleanField(default=False)
+    root_reference = models.BigIntegerField(null=True, blank=True)
+
+
+class NamedEntity(models.Model):
+    """
+    Derived table of the root entities OSM with a name, built after the importation by
+    services.algorithms.algorithm_named_entities. The tags without name are packed in JSON. The
+    name is in the index NameGram if indexed, a change of the name must set indexed to False.
+    """
+    id = models.AutoField(primary_key=True)
+    reference = models.BigIntegerField()
+    shape = models.CharField(choices=STRUCTURE_TYPE, max_length=10)
+    name = models.CharField(max_length=300)
+    is_area = models.BooleanField(default=False)
+    latitude = models.DecimalField(decimal_places=7, max_digits=10, null=True)
+    longitude = models.DecimalField(decimal_places=7, max_digits=11, null=True)
+    tags = models.TextField(default='[]')
+    indexed = models.BooleanField(default=False)
+    date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('reference', 'shape')
+
+
+class NameGram(models.Model):
+    """
+    Inverted index of the bigrams of the names of NamedEntity (services.algorithms.algorithm_name_index),
+    with the quantity of every bigram in the name.
+    """
+    id = models.AutoField(primary_key=True)
+    gram = models.CharField(max_length=2)
+    entity = models.IntegerField(db_index=True)
+    count = models.SmallIntegerField(default=1)
+
+    class Meta:
+        index_together = ['gram', 'entity']
+
+
+class NameVariant(models.Model):
+    """
+    Normalized names of the entities, built at the importation (services.algorithms.algorithm_name_variants):
+    the name, the ascii name and the alternative names of GeoNames, the tags name:* of OSM.
+    A variant is unique by entity, the rows are written with INSERT IGNORE (services.classes.bulk_writer)
+    so an importation run again does not duplicate them. The length of the variant is bounded by the
+    size of the keys of the unique index.
+    """
+    id = models.AutoField(primary_key=True)
+    source = models.CharField(choices=PROVIDERS, max_length=10)
+    reference = models.BigIntegerField()
+    shape = models.CharField(choices=STRUCTURE_TYPE, max_length=10, blank=True, default='')
+    variant = models.CharField(max_length=200)
+    length = models.SmallIntegerField()
+
+    class Meta:
+        unique_together = ('source', 'reference', 'shape', 'variant')
 
 
 class Geonames(models.Model):
@@ -265,6 +356,27 @@ class Parameters(models.Model):
     client_name = models.CharField(max_length=60, default='')
 
 
+class ParametersVersion(models.Model):
+    """
+    Version of a table kept in cache by the processes (services.classes.parameters_cache), one row
+    by table. It is incremented at every change of the table so the processes reload it. The version
+    of NamedEntity is the last id of Tag read by its refresh (services.algorithms.algorithm_named_entities).
+    """
+    id = models.IntegerField(primary_key=True)
+    version = models.BigIntegerField(default=0)
+    date = models.DateTimeField(auto_now=True)
+
+
+class FeatureSynonyms(models.Model):
+    """
+    Synonyms of the name of a feature code (FeatureCode.name) for the alignment of the types, they
+    are read from a file or from the synonyms API once (services.classes.synonyms_store).
+    """
+    feature_name = models.CharField(primary_key=True, max_length=200)
+    synonyms = models.TextField(default='[]')
+    date = models.DateTimeField(auto_now=True)
+
+
 class CorrespondenceTypes(models.Model):
     id = models.AutoField(primary_key=True)
     gn_feature_class = models.CharField(max_length=1)
@@ -318,6 +430,19 @@ class ScheduledWork(models.Model):
     process_id = models.IntegerField(default=0)
 
 
+class ImportationCheckpoint(models.Model):
+    """
+    The last element committed by the OSM importation of a file, and the byte offset
+    of the file where the importation can be restarted.
+    """
+    file_name = models.CharField(primary_key=True, max_length=255)
+    element_type = models.CharField(choices=STRUCTURE_TYPE, max_length=10)
+    element_id = models.BigIntegerField()
+    byte_offset = models.BigIntegerField(default=0)
+    scheduled_work = models.ForeignKey('ScheduledWork', on_delete=models.SET_NULL, null=True, blank=True)
+    date = models.DateTimeField(blank=True, default=timezone.now)
+
+
 class CountryImported(models.Model):
     country_name = models.CharField(primary_key=True, max_length=100)
     date = models.DateTimeField(blank=True, default=timezone.now)
@@ -1,3 +1,278 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
+import os
+import struct
+import tempfile
+import zlib
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+import numpy as np
+from services.models import Geonames, Node, Parameters, ParametersScorePertinence
+from services.algorithms.algorithm_matching import match_partition, set_spatial_index
+from services.algorithms.spatial_index import SpatialIndex, padded_region
+from services.classes.parameters_cache import parameters_cache
+from services.classes.weights_cache import weight_resolver
+from services.classes.osm_reader import read_osm_pbf, OsmNode, OsmWay, OsmRelation, OsmMember
+from util.spatial_grid import CELL_SQL, GRID_COLUMNS, get_cell, get_row, get_column, get_cells_in_box
+from util.string_matching import batch_best_similarity, distance_levenshtein, distance_ngrames, distance_jaro
 
-# Create your tests here.
+
+def create_geonames(geoname_id, latitude, longitude):
+    """
+
+    :param geoname_id:
+    :param latitude:
+    :param longitude:
+    :return: a GeoNames entity not checked
+    """
+    return Geonames.objects.create(id=geoname_id, name='Entity %d' % geoname_id, ascii_name='', alternative_name='',
+                                   latitude=Decimal(latitude), longitude=Decimal(longitude), fclass='P',
+                                   fcode='PPL', cc2='', admin1='', admin2='', admin3='', admin4='', population=0,
+                                   elevation=0, gtopo30=0, timezone='', moddate=date(2017, 1, 1))
+
+
+def empty_spatial_index():
+    """
+
+    :return: a SpatialIndex without nodes
+    """
+    empty = np.array([], dtype=np.int64)
+    return SpatialIndex(empty, np.array([], dtype=np.float64), np.array([], dtype=np.float64), empty, empty, empty,
+                        np.array([], dtype=np.int8))
+
+
+class RegionMatchingTest(TestCase):
+
+    REGION = (43.0, 1.0, 44.0, 2.0)
+
+    def setUp(self):
+        Parameters.objects.create(name='quantity_of_elements_in_blocking_algorithm', value='10', description='')
+        Parameters.objects.create(name='minimun_similarity_name_for_align', value='0.8', description='')
+        parameters_cache.invalidate()
+        ParametersScorePertinence.objects.create(name='weight_matching_global', all_types=True,
+                                                 weight_name=Decimal('0.4'), weight_type=Decimal('0.3'),
+                                                 weight_coordinates=Decimal('0.3'))
+        weight_resolver.invalidate()
+        set_spatial_index(empty_spatial_index())
+
+    def tearDown(self):
+        set_spatial_index(None)
+
+    def test_entity_outside_region_stays_unchecked(self):
+        inside = create_geonames(1, '43.5', '1.5')
+        outside = create_geonames(2, '48.8', '2.3')
+
+        affected, errors = match_partition((inside.id, outside.id, 2.0, 10, self.REGION))
+
+        self.assertEqual((affected, errors), (1, []))
+        self.assertTrue(Geonames.objects.get(pk=inside.id).correspondence_check)
+        self.assertFalse(Geonames.objects.get(pk=outside.id).correspondence_check)
+
+    def test_padded_region_contains_ratio_of_border(self):
+        lat_min, long_min, lat_max, long_max = padded_region(self.REGION, 10.0)
+
+        """
+        10 km are about 0.09 degrees of latitude, and more degrees of longitude at 44 degrees
+        """
+        self.assertAlmostEqual(lat_min, 43.0 - 0.0898, places=3)
+        self.assertAlmostEqual(lat_max, 44.0 + 0.0898, places=3)
+        self.assertLess(long_min, 1.0 - 0.0898 / np.cos(np.radians(44.0)) + 0.001)
+        self.assertGreater(long_max, 2.0 + 0.0898 / np.cos(np.radians(44.0)) - 0.001)
+
+    def test_padded_region_crossing_meridian_180(self):
+        self.assertEqual(padded_region((-20.0, 179.95, -15.0, 180.0), 10.0)[1:4:2], (-180.0, 180.0))
+
+
+"""
+Encoding of the protocol buffers for the PBF files of the tests
+"""
+
+
+def encode_varint(value):
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+
+def encode_zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def encode_field(number, value):
+    """
+
+    :param number: the number of the field
+    :param value: an int (varint) or bytes (length delimited)
+    :return: the field encoded
+    """
+    if isinstance(value, int):
+        return encode_varint(number << 3) + encode_varint(value)
+
+    return encode_varint(number << 3 | 2) + encode_varint(len(value)) + value
+
+
+def encode_packed(number, values, zigzag=False, delta=False):
+    if delta:
+        values = [value - previous for value, previous in zip(values, [0] + values[:-1])]
+    return encode_field(number, b''.join(encode_varint(encode_zigzag(value) if zigzag else value)
+                                         for value in values))
+
+
+def encode_block(block_type, data, compressed=False):
+    """
+
+    :param block_type: OSMHeader or OSMData
+    :param data: the message of the block
+    :param compressed: the blob is compressed with zlib, else it is raw
+    :return: the header size, the header and the blob
+    """
+    blob = encode_field(2, len(data)) + encode_field(3, zlib.compress(data)) if compressed else encode_field(1, data)
+    header = encode_field(1, block_type.encode('utf-8')) + encode_field(3, len(blob))
+
+    return struct.pack('!I', len(header)) + header + blob
+
+
+STRINGS = ['', 'name', 'Paris', 'highway', 'residential', 'type', 'multipolygon', 'outer', 'inner']
+
+
+def primitive_block(*groups):
+    string_table = b''.join(encode_field(1, string.encode('utf-8')) for string in STRINGS)
+    return encode_field(1, string_table) + b''.join(encode_field(2, group) for group in groups)
+
+
+class OsmPbfReaderTest(SimpleTestCase):
+
+    def setUp(self):
+        """
+        A file with a header block, a block of dense nodes compressed and a raw block with a way
+        and a relation
+        """
+        dense_nodes = encode_packed(1, [10, 12, 11], zigzag=True, delta=True) + \
+            encode_packed(8, [488566000, 488570000, -12345670], zigzag=True, delta=True) + \
+            encode_packed(9, [23522000, -23522000, 1799999990], zigzag=True, delta=True) + \
+            encode_packed(10, [1, 2, 0, 0, 3, 4, 0])
+        way = encode_field(1, 5000000000) + encode_packed(2, [3]) + encode_packed(3, [4]) + \
+            encode_packed(8, [10, 12, 11, 10], zigzag=True, delta=True)
+        relation = encode_field(1, 7) + encode_packed(2, [5]) + encode_packed(3, [6]) + \
+            encode_packed(8, [7, 8]) + encode_packed(9, [5000000000, 10], zigzag=True, delta=True) + \
+            encode_packed(10, [1, 0])
+
+        self.header_block = encode_block('OSMHeader', encode_field(4, b'OsmSchema-V0.6'))
+        self.nodes_block = encode_block('OSMData', primitive_block(encode_field(2, dense_nodes)), compressed=True)
+        self.ways_block = encode_block('OSMData', primitive_block(encode_field(3, way), encode_field(4, relation)))
+
+        file_descriptor, self.file = tempfile.mkstemp(suffix='.osm.pbf')
+        with os.fdopen(file_descriptor, 'wb') as file_object:
+            file_object.write(self.header_block + self.nodes_block + self.ways_block)
+
+    def tearDown(self):
+        os.remove(self.file)
+
+    def test_read_elements(self):
+        elements = list(read_osm_pbf(self.file))
+
+        nodes_offset = len(self.header_block)
+        ways_offset = nodes_offset + len(self.nodes_block)
+        self.assertEqual([offset for offset, _ in elements], [nodes_offset] * 3 + [ways_offset] * 2)
+        self.assertEqual([element for _, element in elements], [
+            OsmNode(10, '48.8566000', '2.3522000', [('name', 'Paris')]),
+            OsmNode(12, '48.8570000', '-2.3522000', []),
+            OsmNode(11, '-1.2345670', '179.9999990', [('highway', 'residential')]),
+            OsmWay(5000000000, [10, 12, 11, 10], [('highway', 'residential')]),
+            OsmRelation(7, [OsmMember('way', 5000000000, 'outer'), OsmMember('node', 10, 'inner')],
+                        [('type', 'multipolygon')]),
+        ])
+
+    def test_resume_after_offset(self):
+        ways_offset = len(self.header_block) + len(self.nodes_block)
+
+        elements = list(read_osm_pbf(self.file, offset=ways_offset))
+
+        self.assertEqual([(offset, type(element), element.id) for offset, element in elements],
+                         [(ways_offset, OsmWay, 5000000000), (ways_offset, OsmRelation, 7)])
+
+
+"""
+Points of the borders of the cells of the spatial grid: (latitude, longitude, row, column)
+"""
+GRID_POINTS = [
+    ('0', '0', 1800, 3600),
+    ('0.0499999', '0.0499999', 1800, 3600),
+    ('0.05', '0.05', 1801, 3601),
+    ('-0.0000001', '-0.0000001', 1799, 3599),
+    ('-0.05', '-0.05', 1799, 3599),
+    ('-0.0500001', '-0.0500001', 1798, 3598),
+    ('-90', '-180', 0, 0),
+    ('90', '180', 3599, 0),
+    ('45.5', '179.9999999', 2710, 7199),
+    ('-45.5', '-179.9999999', 890, 0),
+]
+
+
+class SpatialGridTest(SimpleTestCase):
+
+    def test_cells_of_borders(self):
+        for latitude, longitude, row, column in GRID_POINTS:
+            self.assertEqual((get_row(Decimal(latitude)), get_column(Decimal(longitude))), (row, column),
+                             (latitude, longitude))
+            self.assertEqual(get_cell(Decimal(latitude), Decimal(longitude)), row * GRID_COLUMNS + column)
+
+    def test_box_crossing_meridian_180(self):
+        self.assertEqual(get_cells_in_box(Decimal('0'), Decimal('179.9'), Decimal('0.01'), Decimal('-179.9')),
+                         [1800 * GRID_COLUMNS + column for column in (7198, 7199, 0, 1, 2)])
+
+    def test_box_until_meridian_180(self):
+        self.assertEqual(get_cells_in_box(Decimal('0'), Decimal('179.96'), Decimal('0.01'), Decimal('180')),
+                         [1800 * GRID_COLUMNS + column for column in (7199, 0)])
+
+
+class SpatialGridSqlTest(TestCase):
+
+    def test_sql_cells_equal_python_cells(self):
+        for node_id, (latitude, longitude, _, _) in enumerate(GRID_POINTS, 1):
+            Node.objects.create(id=node_id, latitude=Decimal(latitude), longitude=Decimal(longitude))
+
+        cursor = connection.cursor()
+        cursor.execute("UPDATE services_node SET cell = {0}".format(CELL_SQL))
+
+        for node in Node.objects.order_by('id'):
+            self.assertEqual(node.cell, get_cell(node.latitude, node.longitude), (node.latitude, node.longitude))
+
+
+"""
+Names of different lengths, cases and prefixes, with small differences between them
+"""
+WORDS = ['Paris', 'paris', 'Parys', 'Pariss', 'Aris', 'Sirap', 'Saint-Paris', 'Paris 15e Arrondissement',
+         'Le Mans', 'Mans', 'le mans', 'Lemans', 'Toulouse', 'Toulousain', 'Tolosa', 'Tou', 'T', 'Montreal',
+         'Montréal', 'Mont Royal', 'Saint-Étienne', 'Saint Etienne', 'St Etienne', 'Etienne', 'ab', 'ba', 'a', '']
+
+SCALAR_METRICS = {
+    'levenshtein': distance_levenshtein,
+    'ngrames': distance_ngrames,
+    'jaro': distance_jaro,
+}
+
+
+class BatchSimilarityTest(SimpleTestCase):
+
+    def test_pruned_batch_equal_scalar_metric(self):
+        sources = [['Paris'], ['Le Mans', 'Lemans'], ['Saint-Étienne', 'St Etienne'], ['Toulouse', 'Tolosa'],
+                   ['ab'], ['Montreal', 'a']]
+
+        for metric, scalar in SCALAR_METRICS.items():
+            for source_strings in sources:
+                for threshold in (None, 0.3, 0.5, 0.6, 0.75, 0.8, 0.9, 1.0):
+                    expected = []
+                    for word in WORDS:
+                        values = [scalar(source, word) for source in source_strings if word]
+                        values = [value for value in values if threshold is None or value >= threshold]
+                        expected.append(max(values) if values else False)
+
+                    self.assertEqual(batch_best_similarity(source_strings, WORDS, metric, threshold), expected,
+                                     (metric, source_strings, threshold))
@@ -7,6 +7,8 @@ from .models import *
 from .serializer import *
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from services.classes.thread import BackgroundProcess
+from services.classes.types_cache import types_changed
+from services.classes.weights_cache import weights_changed
 import random
 
 
@@ -82,6 +84,11 @@ class ParametersScorePertinenceViewSet(viewsets.ModelViewSet):
             ParametersScorePertinence.objects.filter(gn_feature_class=request.data['gn_feature_class'],
                                                      gn_feature_code=request.data['gn_feature_code']).update(active=0)
 
+        """
+        The updates do not send signals, the weights in cache are invalidated here
+        """
+        weights_changed()
+
         serializer = ParametersScorePertinenceSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
@@ -315,11 +322,16 @@ class ScheduledWorkViewSet(viewsets.ModelViewSet):
         if request.data.get('name', '') == SCHEDULED_WORK_IMPORTATION_PROCESS and not request.data.get('country_name'):
             raise Exception("Country name parameter required")
 
+        """
+        The parameter can be a boolean (JSON) or a string (form or query), "false" is not a resume
+        """
+        resume = str(request.data.get('resume', False)).lower() in ('true', '1', 'yes', 'on')
+
         if request.data.get('name', '') == SCHEDULED_WORK_IMPORTATION_PROCESS:
             count = CountryImported.objects.filter(country_name=request.data.get('country_name', '').upper()).count()
-            if count > 0:
+            if count > 0 and not resume:
                 raise Exception("The country had already imported")
-            else:
+            elif count == 0:
                 country_imported = CountryImported(country_name=request.data.get('country_name'))
                 country_imported.save()
 
@@ -329,7 +341,7 @@ class ScheduledWorkViewSet(viewsets.ModelViewSet):
             thread = BackgroundProcess(thread_id=request.data.get('process_id'), name=request.data.get('name'),
                                        process=request.data.get('name'),
                                        positional_params=request.data.get('file_name'),
-                                       others_params='skip_geonames')
+                                       others_params='skip_geonames', resume=resume)
             thread.start()
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -390,4 +402,9 @@ class CorrespondenceTypesInvalidViewSet(mixins.CreateModelMixin,
             CorrespondenceTypesInvalid.objects.filter(pk=type_correspondence.id) \
                 .update(quantity=request.data['quantity'], active=request.data['active'])
 
+            """
+            The update does not send the signal post_save, the cache of the types is invalidated here
+            """
+            types_changed()
+
             return Response(request.data, status=status.HTTP_200_OK)
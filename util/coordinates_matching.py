@@ -1,12 +1,30 @@
+from datetime import datetime
+from django.db import connection
+from django.db.models import Max, Min
 from gpxpy.geo import haversine_distance
-from services.models import Parameters
-from services.algorithms.geolocation import GeoLocation
+from services.classes.parameters_cache import get_parameter
+from services.algorithms.geolocation import EARTH_RADIUS, distances_to
+from services.models import CorrespondenceEntity
 
 FIRST_LEVEL_PRECISION_MATCH = 5
 SECOND_LEVEL_PRECISION_MATCH = 4
 THIRD_LEVEL_PRECISION_MATCH = 3
 LAST_LEVEL_PRECISION_MATCH = 1
 
+RECALCULATION_CHUNK_SIZE = 50000
+
+"""
+The similarity of matching_coordinates calculated by the database for a chunk of correspondences,
+with the distance of distance_matrix (services/algorithms/geolocation.py). The values are kept in the limits of the column
+DECIMAL(4, 3).
+"""
+RECALCULATE_COORDINATES_MATCHING = \
+    "UPDATE services_correspondenceentity c JOIN services_geonames g ON g.id = c.reference_gn " \
+    "SET c.similarity_coordinates = GREATEST(-9.999, ROUND(1 - %(radius)s * ACOS(LEAST(1, " \
+    "SIN(RADIANS(g.latitude)) * SIN(RADIANS(c.osm_latitude)) + COS(RADIANS(g.latitude)) * " \
+    "COS(RADIANS(c.osm_latitude)) * COS(RADIANS(g.longitude) - RADIANS(c.osm_longitude)))) / %(search_ratio)s, 3)) " \
+    "WHERE c.id BETWEEN %(id_begin)s AND %(id_end)s"
+
 
 def distance_gps(point1, point2):
     """
@@ -28,21 +46,56 @@ def matching_coordinates(point_reference, point_in_search_ratio, search_ratio=Fa
     :param search_ratio:
     :return: 
     """
-    point1 = GeoLocation.from_degrees(point_reference.get_latitude(), point_reference.get_longitude())
-    point2 = GeoLocation.from_degrees(float(point_in_search_ratio.get_latitude()), float(point_in_search_ratio.get_longitude()))
+    return matching_coordinates_batch(point_reference, [point_in_search_ratio.get_latitude()],
+                                      [point_in_search_ratio.get_longitude()], search_ratio)[0]
 
-    if not search_ratio:
-        search_ratio = float(Parameters.objects.get(name='search_radius_for_blocking').value)
-    distance = point1.distance_to(point2)
-    matching = 1 - (distance / search_ratio)
 
-    return round(matching, 3)
+def matching_coordinates_batch(point_reference, latitudes, longitudes, search_ratio=False):
+    """
+    This method calculates the Sim_{coord} of an entity with many points together, the distances
+    are calculated with one operation on the arrays (services/algorithms/geolocation.py)
+
+    :param point_reference: the PositionGPS of the entity
+    :param latitudes: the latitudes of the points in degrees
+    :param longitudes: the longitudes of the points in degrees
+    :param search_ratio: the search ratio, the parameter search_radius_for_blocking if False
+    :return: the list of the similarities, in the order of the points
+    """
+    if not len(latitudes):
+        return []
 
+    if not search_ratio:
+        search_ratio = get_parameter('search_radius_for_blocking', float)
+    distances = distances_to(point_reference.get_latitude(), point_reference.get_longitude(), latitudes, longitudes)
+    matching = 1 - (distances / search_ratio)
 
+    return [round(float(value), 3) for value in matching]
 
 
+def recalculate_coordinates_matching(search_ratio=False, chunk_size=RECALCULATION_CHUNK_SIZE):
+    """
+    This method calculates again the Sim_{coord} of all the correspondences with one UPDATE by
+    chunk of ids, for example after a change of the search ratio
 
+    :param search_ratio: the search ratio, the parameter search_radius_for_blocking if False
+    :param chunk_size: the quantity of ids updated together
+    :return: the quantity of correspondences updated
+    """
+    if not search_ratio:
+        search_ratio = get_parameter('search_radius_for_blocking', float)
 
+    ids = CorrespondenceEntity.objects.aggregate(id_min=Min('id'), id_max=Max('id'))
+    if ids['id_min'] is None:
+        return 0
 
+    cursor = connection.cursor()
+    count = 0
+    for chunk_begin in range(ids['id_min'], ids['id_max'] + 1, chunk_size):
+        cursor.execute(RECALCULATE_COORDINATES_MATCHING, {'radius': EARTH_RADIUS, 'search_ratio': search_ratio,
+                                                          'id_begin': chunk_begin,
+                                                          'id_end': chunk_begin + chunk_size - 1})
+        count += cursor.rowcount
 
+        print("%s INFO: %d correspondences updated." % (datetime.now(), count))
 
+    return count
@@ -0,0 +1,90 @@
+from decimal import Decimal, ROUND_FLOOR
+
+"""
+Fixed grid on the latitude and the longitude, every cell is 1/CELLS_BY_DEGREE degrees (0.05 degrees,
+about 5.5 km on the latitude). The id of a cell is row * GRID_COLUMNS + column.
+
+The cells are calculated with decimals, so the cell of a node is the same in Python and in MySQL
+(CELL_SQL) with the DECIMAL columns.
+"""
+
+CELLS_BY_DEGREE = 20
+GRID_ROWS = 180 * CELLS_BY_DEGREE
+GRID_COLUMNS = 360 * CELLS_BY_DEGREE
+
+CELL_SQL = "FLOOR(LEAST(latitude + 90, 179.9999999) * {0}) * {1} + MOD(FLOOR((longitude + 180) * {0}), {1})"\
+    .format(CELLS_BY_DEGREE, GRID_COLUMNS)
+
+
+def get_row(latitude):
+    """
+    :param latitude: in degrees
+    :return: the row of the latitude, the latitude 90 is in the last row
+    """
+    row = int(((Decimal(latitude) + 90) * CELLS_BY_DEGREE).to_integral_value(rounding=ROUND_FLOOR))
+    return min(max(row, 0), GRID_ROWS - 1)
+
+
+def get_column(longitude):
+    """
+    :param longitude: in degrees
+    :return: the column of the longitude, the longitude 180 is the same column as -180
+    """
+    column = int(((Decimal(longitude) + 180) * CELLS_BY_DEGREE).to_integral_value(rounding=ROUND_FLOOR))
+    return column % GRID_COLUMNS
+
+
+def get_box_columns(long_min, long_max):
+    """
+    :param long_min:
+    :param long_max:
+    :return: the list of the columns of a bounding box, if long_min is greater than long_max the box
+    crosses the meridian 180 and the columns go from long_min to 180 and from -180 to long_max
+    """
+    column_min = get_column(long_min)
+
+    if Decimal(long_min) > Decimal(long_max):
+        return list(range(column_min, GRID_COLUMNS)) + list(range(0, get_column(long_max) + 1))
+
+    column_max = int(((Decimal(long_max) + 180) * CELLS_BY_DEGREE).to_integral_value(rounding=ROUND_FLOOR))
+    if column_max >= GRID_COLUMNS:
+        """
+        The longitude 180 is in the column 0
+        """
+        return list(range(column_min, GRID_COLUMNS)) + ([0] if column_min > 0 else [])
+
+    return list(range(column_min, column_max + 1))
+
+
+def get_cell(latitude, longitude):
+    """
+    :param latitude: in degrees
+    :param longitude: in degrees
+    :return: the id of the cell of the point
+    """
+    return get_row(latitude) * GRID_COLUMNS + get_column(longitude)
+
+
+def get_cells_in_box(lat_min, long_min, lat_max, long_max):
+    """
+    This method returns the ids of all the cells which cover a bounding box
+    :param lat_min:
+    :param long_min:
+    :param lat_max:
+    :param long_max:
+    :return: the list of the ids of the cells
+    """
+    columns = get_box_columns(long_min, long_max)
+    return [row * GRID_COLUMNS + column for row in range(get_row(lat_min), get_row(lat_max) + 1)
+            for column in columns]
+
+
+def count_cells_in_box(lat_min, long_min, lat_max, long_max):
+    """
+    :param lat_min:
+    :param long_min:
+    :param lat_max:
+    :param long_max:
+    :return: the quantity of cells which cover the bounding box
+    """
+    return (get_row(lat_max) - get_row(lat_min) + 1) * len(get_box_columns(long_min, long_max))
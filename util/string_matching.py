@@ -1,6 +1,9 @@
+import math
 from jellyfish import levenshtein_distance, jaro_winkler
 from ngram import NGram
 
+FLOAT_TOLERANCE = 1e-9
+
 
 def distance_levenshtein(source_string, comparaison_string):
     """
@@ -49,5 +52,113 @@ def distance_jaro(source_string, comparaison_string):
     return jaro_winkler(source_string, comparaison_string)
 
 
+"""
+Les fonctions par lot comparent une chaine avec toutes les chaines candidates d'un bloc. Chaque chaine
+est normalisee une seule fois, et avec un seuil les candidats dont la difference de taille ou le prefixe
+ne permet pas d'atteindre le seuil ne sont pas calcules.
+"""
+
+
+def _levenshtein(source_string, comparaison_string):
+    max_distance = max(len(source_string), len(comparaison_string))
+    return (max_distance - levenshtein_distance(source_string, comparaison_string)) / max_distance
+
+
+def _levenshtein_bound(source_length, comparaison_length):
+    """
+    La distance de levenshtein est au moins la difference des tailles
+    """
+    return min(source_length, comparaison_length) / max(source_length, comparaison_length)
+
+
+def _levenshtein_prefix(source_string, comparaison_string, threshold):
+    """
+    Avec au plus k operations, au moins un des k + 1 premiers caracteres de la source est garde, et il
+    est dans les 2k + 1 premiers caracteres de l'autre chaine
+    """
+    max_length = max(len(source_string), len(comparaison_string))
+    max_distance = math.floor((1 - threshold) * max_length + FLOAT_TOLERANCE)
+    if len(source_string) <= max_distance:
+        return True
+
+    return not set(source_string[:max_distance + 1]).isdisjoint(comparaison_string[:2 * max_distance + 1])
+
+
+def _ngrames(source_string, comparaison_string):
+    return NGram.compare(source_string, comparaison_string, N=2)
+
+
+def _ngrames_bound(source_length, comparaison_length):
+    """
+    Les bigrames communs sont au plus les bigrames de la chaine plus petite (avec le padding)
+    """
+    return (min(source_length, comparaison_length) + 1) / (max(source_length, comparaison_length) + 1)
+
+
+def _jaro_bound(source_length, comparaison_length):
+    """
+    Les caracteres communs sont au plus la taille de la chaine plus petite, et le prefixe commun
+    de Winkler est au plus de 4 caracteres
+    """
+    common = min(source_length, comparaison_length)
+    jaro = (common / source_length + common / comparaison_length + 1) / 3
+    return jaro + 0.4 * (1 - jaro)
+
+
+"""
+Pour chaque methode: la fonction de similarite, si les chaines sont mises en minuscules, la
+borne superieure de la similarite selon les tailles des chaines, et le filtre des prefixes (les
+chaines qui ne passent pas le filtre ne peuvent pas atteindre le seuil)
+"""
+METRICS = {
+    'levenshtein': (_levenshtein, True, _levenshtein_bound, _levenshtein_prefix),
+    'ngrames': (_ngrames, True, _ngrames_bound, None),
+    'jaro': (jaro_winkler, False, _jaro_bound, None),
+}
+
+
+def batch_similarity(source_string, comparaison_strings, metric='levenshtein', threshold=None):
+    """
+    Cette methode calcule la similarite d'une chaine avec une liste de chaines candidates
+
+    :param source_string: le chaine de caracteres qu'on veut comparer
+    :param comparaison_strings: la liste des chaines candidates
+    :param metric: levenshtein, ngrames ou jaro
+    :param threshold: le seuil minimun, les similarites plus petites sont False
+    :return: la liste des pourcentages de matching, dans l'ordre des candidats
+    """
+    return batch_best_similarity([source_string], comparaison_strings, metric, threshold)
+
+
+def batch_best_similarity(source_strings, comparaison_strings, metric='levenshtein', threshold=None):
+    """
+    Cette methode calcule, pour chaque chaine candidate, la meilleure similarite avec une des chaines
+    sources (par exemple le nom et les noms alternatifs d'une entite GeoNames)
+
+    :param source_strings: la liste des chaines de caracteres qu'on veut comparer
+    :param comparaison_strings: la liste des chaines candidates
+    :param metric: levenshtein, ngrames ou jaro
+    :param threshold: le seuil minimun, les similarites plus petites sont False
+    :return: la liste des pourcentages de matching, dans l'ordre des candidats
+    """
+    similarity, lower, bound, prefix = METRICS[metric]
+
+    sources = [source.lower() if lower else source for source in source_strings if source]
+
+    results = []
+    for comparaison_string in comparaison_strings:
+        best = False
+        if comparaison_string:
+            candidate = comparaison_string.lower() if lower else comparaison_string
+            for source in sources:
+                if threshold is not None and (bound(len(source), len(candidate)) < threshold or
+                                              (prefix and not prefix(source, candidate, threshold))):
+                    continue
+
+                value = similarity(source, candidate)
+                if (threshold is None or value >= threshold) and (best is False or value > best):
+                    best = value
 
+        results.append(best)
 
+    return results